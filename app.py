@@ -6,6 +6,7 @@ from streamlit_calendar import calendar
 from modules.gen_synth_data import generate_data
 import modules.parse_data as parse_data
 import modules.solver as solver
+import modules.jobs as jobs
 from modules.streamlit_utils import load_css
 
 import re
@@ -102,6 +103,9 @@ with st.expander("Settings"):
     preference_weight = st.number_input("Preference Weight", min_value=0.0, max_value=10.0, value=1.5)
     deviation_weight  = st.number_input("Deviation Weight", min_value=0.0, max_value=10.0, value=1.0)
     solver_time       = st.slider("Solver Time (seconds)", min_value=1, max_value=180, value=10)
+    show_stats        = st.checkbox("Show solver statistics", value=False)
+    warm_start        = st.checkbox("Start from the previous schedule", value=True, help="Reschedules after small edits faster, and with fewer changes")
+    live_updates      = st.checkbox("Show schedules as they are found", value=False, help="Updates the schedule whenever the solver improves it, and lets you stop early")
     
 # Display data
 with st.expander("Employees and Preferences"):
@@ -128,18 +132,200 @@ with st.expander("To Fill"):
         use_container_width = True
     )
 
+# Schedule display
+def show_schedule(schedule, employees, weeks):
+    """Shows a schedule's calendar, employee dissatisfaction and download."""
+    schedule_json = [
+        {
+            "title": f'{emp_name} - {position}',
+            "start": timespan.start.isoformat(),
+            "end": timespan.end.isoformat(),
+            "resourceId": position,
+        }    
+        for emp_name, position, timespan in schedule
+    ]
+    
+    calendar(events=schedule_json, callbacks=[], options={
+        #"selectable": "true",
+        "initialView": "resourceTimeGridDay", # Ideally resourceTimeGridDay
+        "resourceGroupField": "building",
+        #"datesAboveResources": True,
+        "initialDate": st.session_state.start_date.isoformat(),
+        "validRange": {
+            "start": st.session_state.start_date.isoformat(),
+            "end": st.session_state.end_date.isoformat()
+        },
+        "resources": list(
+            {"id": position, "title": position, "building": position}
+            for position in set(position for _, position, _ in schedule)
+        ),
+    })
+
+    # Display employee Dissatisfaction
+    get_emp_times = lambda emp_name: [shift for name_s, _, shift in schedule if name_s == emp_name]
+    get_tot_hours = lambda emp_name: sum(shift.length.total_seconds() / 3600 for shift in get_emp_times(emp_name))
+    emp_sats = pd.DataFrame(
+        [
+            (
+                emp_name,
+                emp.tenure,
+                emp.preferred_hours,
+                get_tot_hours(emp_name), 
+                *emp.satisfaction_details(get_emp_times(emp_name)),
+                emp.calculate_satisfaction(get_emp_times(emp_name)),
+                any(
+                    shift not in emp.availability
+                    for shift in get_emp_times(emp_name)
+                )
+            )
+            for emp_name, emp in employees.items()
+        ],
+        columns=["Employee", "Tenure", "Hours Preferred", "Hours Scheduled", "Deviation", "Preference", "Dissatisfaction", "Scheduled while Unavailable"]
+    )
+
+    # Normalize the Dissatisfaction values
+    emp_sats["Deviation"] = emp_sats["Deviation"].fillna(0.0) / len(weeks)
+    max_deviation = emp_sats["Deviation"].max()
+    
+    emp_sats["Preference"] = emp_sats["Preference"].apply(abs)
+    emp_sats["Preference"] = (emp_sats["Preference"] - emp_sats["Preference"].min()) / emp_sats["Preference"].max()
+    emp_sats["Preference"] = emp_sats["Preference"].fillna(1.0) if emp_sats["Preference"].max() == 0 else emp_sats["Preference"].fillna(0.0)
+    emp_sats["Preference"] *= 100.0
+    
+    emp_sats["Dissatisfaction"] = -1 * emp_sats["Dissatisfaction"]
+    emp_sats["Dissatisfaction"] = (emp_sats["Dissatisfaction"] - emp_sats["Dissatisfaction"].min()) / np.float32(emp_sats["Dissatisfaction"].max() - emp_sats["Dissatisfaction"].min())
+    emp_sats["Dissatisfaction"] = emp_sats["Dissatisfaction"].fillna(1.0)
+    emp_sats["Dissatisfaction"] *= 100.0
+    
+    # Display the Dissatisfaction values
+    st.dataframe(emp_sats, hide_index=True, use_container_width = True, column_config={
+        "Employee": st.column_config.TextColumn("Employee Name"),
+        "Tenure": st.column_config.NumberColumn("Employee Tenure"),
+        "Hours Scheduled": st.column_config.NumberColumn("Hours Scheduled", format="%.1f hr"),
+        "Deviation": st.column_config.ProgressColumn("Deviation from Preferred Hours", help="More is worse", format="%.1f hr", min_value=0.0, max_value=max_deviation),
+        "Preference": st.column_config.ProgressColumn("Shift Preference", format="%.2f%%", min_value=0.0, max_value=100.0),
+        "Dissatisfaction": st.column_config.ProgressColumn("Dissatisfaction", format="%.2f%%", min_value=0.0, max_value=100.0),
+        "Scheduled while Unavailable": st.column_config.CheckboxColumn("Scheduled while Unavailable", help="True if the employee was scheduled during a time they were unavailable")
+    })
+    
+    # Have the easily-importable data available for download
+    importable_data = parse_data.export_schedule(schedule)
+    
+    st.download_button(
+        "Download Schedule",
+        importable_data.to_csv(index=False),
+        "schedule.csv",
+        "text/csv",
+        key="download_schedule"
+    )
+
 # Schedule shifts
 def reseed():
     st.session_state.seed = random.randint(0, 365)
     
-left, right = st.columns(2)
+left, mid, right = st.columns(3)
 should_reschedule = left.button("Schedule Shifts")
-should_reseed     = right.button("Reseed & Schedule")
+should_reseed     = mid.button("Reseed & Schedule")
+should_draft      = right.button("Quick Draft", help="Builds a schedule in moments without the solver, which may be less fair")
 
 if should_reseed:
     st.session_state.seed = random.randint(0, 365) + st.session_state.seed
+    st.session_state.previous_schedule = None
+
+def show_stats_panel(stats):
+    with st.expander("Solver Statistics", expanded=True):
+        left, mid, right = st.columns(3)
+        left.metric("Status", stats.status or "-")
+        mid.metric("Conflicts", stats.conflicts)
+        right.metric("Branches", stats.branches)
+        left.metric("Objective", "-" if stats.objective == None else f"{stats.objective:,.1f}")
+        mid.metric("Best Bound", "-" if stats.best_bound == None else f"{stats.best_bound:,.1f}")
+        right.metric("Gap", "-" if stats.gap == None else f"{100 * stats.gap:.2f}%")
+        
+        st.caption("Within availability only" if stats.hard_availability else "Allowing shifts outside of availability")
+        st.dataframe(pd.DataFrame(
+            [
+                (phase, seconds, stats.variable_counts.get(phase), stats.constraint_counts.get(phase))
+                for phase, seconds in stats.phase_times.items()
+            ],
+            columns=["Phase", "Time", "Variables", "Constraints"]
+        ), hide_index=True, use_container_width=True, column_config={
+            "Time": st.column_config.NumberColumn("Time", format="%.3f s"),
+        })
+        
+        if stats.progress:
+            progress = pd.DataFrame(stats.progress, columns=["Seconds", "Objective", "Best Bound"])
+            st.line_chart(progress.ffill(), x="Seconds", y=["Objective", "Best Bound"])
+
+def show_feasibility(report):
+    """Shows why the shifts cannot be filled, if the solver's pre-check found out. Returns whether it did."""
+    if report == None or report.feasible:
+        return False
+    
+    st.write("There are not enough employees to fill these shifts:")
+    if report.uncovered:
+        st.caption("No qualified employee is available")
+        st.dataframe(pd.DataFrame(
+            [(position, window.start, window.end) for position, window in report.uncovered],
+            columns=["Position", "From", "To"]
+        ), hide_index=True, use_container_width=True)
+    if report.understaffed:
+        st.caption("More positions are open at once than employees can work them")
+        st.dataframe(pd.DataFrame(
+            [(", ".join(positions), window.start, window.end, needed, able) for positions, window, needed, able in report.understaffed],
+            columns=["Positions", "From", "To", "Employees Needed", "Employees Able"]
+        ), hide_index=True, use_container_width=True)
+    if report.weekly_shortfalls:
+        st.caption("Employees cannot work enough hours within their weekly limits")
+        st.dataframe(pd.DataFrame(
+            [(f"{year}-W{week:02d}", ", ".join(positions), needed, able) for (year, week), positions, needed, able in report.weekly_shortfalls],
+            columns=["Week", "Positions", "Hours Needed", "Hours Available"]
+        ), hide_index=True, use_container_width=True, column_config={
+            "Hours Needed": st.column_config.NumberColumn("Hours Needed", format="%.1f"),
+            "Hours Available": st.column_config.NumberColumn("Hours Available", format="%.1f"),
+        })
+    return True
+
+def show_job(key, employees, weeks, polling):
+    """Shows the progress and schedule of a background solve. Reruns every second while polling."""
+    job = jobs.job_queue().get(key)
+    if job == None:
+        return
+    if polling and job.is_finished:
+        # Rerun the whole page once to stop polling
+        st.rerun()
+    
+    if job.status == "queued":
+        st.caption("Waiting for a free solver...")
+    elif job.status == "running":
+        st.caption(
+            f"Solving for {job.elapsed:.0f} s. " +
+            ("" if job.latest == None else "Drafted a schedule, searching for better ones. " if job.latest.objective == None else
+             f"Objective {job.latest.objective:,.1f} (gap {100 * job.latest.gap:.2f}%), searching for better schedules. ")
+        )
+    elif job.status == "cancelled":
+        st.caption(f"Stopped the search after {job.elapsed:.0f} s. Showing the best schedule found.")
+    elif job.status == "failed":
+        st.error(f"Scheduling failed:\n```\n{job.error}\n```")
+        return
     
-if should_reschedule or should_reseed:
+    if not job.is_finished:
+        # Only live jobs have a best schedule to show, and stop, before they finish
+        if not job.live:
+            return
+        st.button("Stop and keep current best", on_click=job.cancel)
+    
+    if job.is_finished and show_stats:
+        show_stats_panel(job.stats)
+    
+    if job.schedule != None:
+        if job.is_finished: st.session_state.previous_schedule = job.schedule
+        show_schedule(job.schedule, employees, weeks)
+    elif job.is_finished:
+        if not show_feasibility(job.stats.feasibility):
+            st.write("Failed to schedule shifts. Ensure you have enough employees to cover all shifts!")
+
+if should_reschedule or should_reseed or should_draft:
     st.write(f"Seed: {st.session_state.seed}")
     
     employees = parse_data.parse_employees(st.session_state.preferences)
@@ -156,119 +342,35 @@ if should_reschedule or should_reseed:
     # but has no availability
     #employees[None] = solver.Employee(tenure=0, preferences=solver.AveragePreference(), preferred_hours=None)
     
-    # Schedule shifts
-    schedule = solver.create_schedule(
-        shifts_to_fill,
-        employees,
+    options = dict(
         min_one_shift_per_employee=bool(min_one_shift),
         max_hours_per_week=max_hours,
         solver_seed=st.session_state.seed,
-        solver_max_time=solver_time
+        solver_max_time=solver_time,
+        previous_schedule=st.session_state.get('previous_schedule') if warm_start else None
     )
-
-    if schedule == None:
-        st.write("Failed to schedule shifts. Ensure you have enough employees to cover all shifts!")
-    else:
-        schedule_json = [
-            {
-                "title": f'{emp_name} - {position}',
-                "start": timespan.start.isoformat(),
-                "end": timespan.end.isoformat(),
-                "resourceId": position,
-            }    
-            for emp_name, position, timespan in schedule
-        ]
+    
+    if should_draft:
+        # Drafts take moments, so are made right away
+        st.session_state.pop('job', None)
+        schedule, stats = solver.create_schedule(shifts_to_fill, employees, return_stats=True, quick=True, **options)
+        if schedule != None:
+            st.session_state.previous_schedule = schedule
         
-        calendar(events=schedule_json, callbacks=[], options={
-            #"selectable": "true",
-            "initialView": "resourceTimeGridDay", # Ideally resourceTimeGridDay
-            "resourceGroupField": "building",
-            #"datesAboveResources": True,
-            "initialDate": st.session_state.start_date.isoformat(),
-            "validRange": {
-                "start": st.session_state.start_date.isoformat(),
-                "end": st.session_state.end_date.isoformat()
-            },
-            "resources": list(
-                {"id": position, "title": position, "building": position}
-                for position in set(position for _, position, _ in schedule)
-            ),
-        })
-
-        # Display employee Dissatisfaction
-        get_emp_times = lambda emp_name: [shift for name_s, _, shift in schedule if name_s == emp_name]
-        get_tot_hours = lambda emp_name: sum(shift.length.total_seconds() / 3600 for shift in get_emp_times(emp_name))
-        emp_sats = pd.DataFrame(
-            [
-                (
-                    emp_name,
-                    emp.tenure,
-                    emp.preferred_hours,
-                    get_tot_hours(emp_name), 
-                    *emp.satisfaction_details(get_emp_times(emp_name)),
-                    emp.calculate_satisfaction(get_emp_times(emp_name)),
-                    any(
-                        not any(shift in timespan for timespan in emp.availability)
-                        for shift in get_emp_times(emp_name)
-                    )
-                )
-                for emp_name, emp in employees.items()
-            ],
-            columns=["Employee", "Tenure", "Hours Preferred", "Hours Scheduled", "Deviation", "Preference", "Dissatisfaction", "Scheduled while Unavailable"]
-        )
+        if show_stats:
+            show_stats_panel(stats)
+        if schedule == None:
+            if not show_feasibility(stats.feasibility):
+                st.write("Could not draft a schedule quickly. Try Schedule Shifts, which searches further.")
+        else:
+            show_schedule(schedule, employees, weeks)
+    else:
+        # Solves run in the background, so the page stays usable and many managers can solve at once
+        job = jobs.job_queue().submit(shifts_to_fill, employees, live=live_updates, **options)
+        st.session_state.job = (job.key, employees, weeks)
 
-        # Normalize the Dissatisfaction values
-        emp_sats["Deviation"] = emp_sats["Deviation"].fillna(0.0) / len(weeks)
-        max_deviation = emp_sats["Deviation"].max()
-        
-        emp_sats["Preference"] = emp_sats["Preference"].apply(abs)
-        emp_sats["Preference"] = (emp_sats["Preference"] - emp_sats["Preference"].min()) / emp_sats["Preference"].max()
-        emp_sats["Preference"] = emp_sats["Preference"].fillna(1.0) if emp_sats["Preference"].max() == 0 else emp_sats["Preference"].fillna(0.0)
-        emp_sats["Preference"] *= 100.0
-        
-        emp_sats["Dissatisfaction"] = -1 * emp_sats["Dissatisfaction"]
-        emp_sats["Dissatisfaction"] = (emp_sats["Dissatisfaction"] - emp_sats["Dissatisfaction"].min()) / np.float32(emp_sats["Dissatisfaction"].max() - emp_sats["Dissatisfaction"].min())
-        emp_sats["Dissatisfaction"] = emp_sats["Dissatisfaction"].fillna(1.0)
-        emp_sats["Dissatisfaction"] *= 100.0
-        
-        # Display the Dissatisfaction values
-        st.dataframe(emp_sats, hide_index=True, use_container_width = True, column_config={
-            "Employee": st.column_config.TextColumn("Employee Name"),
-            "Tenure": st.column_config.NumberColumn("Employee Tenure"),
-            "Hours Scheduled": st.column_config.NumberColumn("Hours Scheduled", format="%.1f hr"),
-            "Deviation": st.column_config.ProgressColumn("Deviation from Preferred Hours", help="More is worse", format="%.1f hr", min_value=0.0, max_value=max_deviation),
-            "Preference": st.column_config.ProgressColumn("Shift Preference", format="%.2f%%", min_value=0.0, max_value=100.0),
-            "Dissatisfaction": st.column_config.ProgressColumn("Dissatisfaction", format="%.2f%%", min_value=0.0, max_value=100.0),
-            "Scheduled while Unavailable": st.column_config.CheckboxColumn("Scheduled while Unavailable", help="True if the employee was scheduled during a time they were unavailable")
-        })
-        
-        # Have the easily-importable data available for download
-        importable_data = pd.DataFrame(
-            [
-                (
-                    "",
-                    name,
-                    "",
-                    position,
-                    timespan.start.date().isoformat(),
-                    timespan.end.date().isoformat(),
-                    timespan.start.strftime("%I:%M %p"),
-                    timespan.end.strftime("%I:%M %p"),
-                    "",
-                    "",
-                    "",
-                    "",
-                    ""
-                )
-                for name, position, timespan in schedule
-            ],
-            columns=["eid", "name", "location", "position", "start date", "end date", "start time", "end time", "notes", "title", "open slots", "remote site", "shift tags"]
-        )
-        
-        st.download_button(
-            "Download Schedule",
-            importable_data.to_csv(index=False),
-            "schedule.csv",
-            "text/csv",
-            key="download_schedule"
-        )
+# The last solve is shown on every rerun, until it is replaced
+if 'job' in st.session_state and not should_draft:
+    job = jobs.job_queue().get(st.session_state.job[0])
+    polling = job != None and not job.is_finished
+    st.fragment(show_job, run_every=1 if polling else None)(*st.session_state.job, polling)
@@ -0,0 +1,54 @@
+"""
+Compares the preferred-hours deviation encodings of the solver on synthetic data.
+
+Run from the repository root:
+    python -m benchmarks.bench_deviation --employees 60 --weeks 2 --time 20
+
+Models are built with hard availability unless --soft is given, since the huge penalty
+on unavailable shifts otherwise dominates both the objective and the comparison.
+"""
+import argparse
+import time
+
+import modules.solver as solver
+from benchmarks.bench_schedule import load_problem
+
+def score(schedule, employees) -> tuple[float, float]:
+    """
+    Scores a schedule with the same heuristic the solver optimizes, independent of its encoding.
+    Returns the total (deviation, preference) satisfaction; lower deviation and higher preference are better.
+    """
+    deviation, preference = 0.0, 0.0
+    for emp_name, employee in employees.items():
+        emp_deviation, emp_preference = employee.satisfaction_details([shift for name, _, shift in schedule if name == emp_name])
+        deviation += emp_deviation
+        preference += emp_preference
+    return deviation, preference
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=60)
+    parser.add_argument("--weeks", type=int, default=2)
+    parser.add_argument("--time", type=float, default=20, help="solver time limit in seconds")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--soft", action="store_true", help="allow (penalized) shifts while unavailable")
+    args = parser.parse_args()
+    
+    print(f"{'seed':>4} {'encoding':>9} {'build (s)':>10} {'solve (s)':>10} {'deviation':>10} {'preference':>11}")
+    for seed in args.seeds:
+        to_schedule, employees = load_problem(args.employees, args.weeks, seed)
+        for encoding in ("division", "linear"):
+            start = time.perf_counter()
+            schedule_model = solver.build_model(to_schedule, employees, hard_availability=not args.soft, deviation_encoding=encoding)
+            built = time.perf_counter()
+            schedule = solver.solve_model(schedule_model, solver_max_time=args.time, solver_seed=seed)
+            solved = time.perf_counter()
+            
+            if schedule == None:
+                print(f"{seed:>4} {encoding:>9} {built - start:>10.2f} {solved - built:>10.2f} {'infeasible':>22}")
+                continue
+            deviation, preference = score(schedule, employees)
+            print(f"{seed:>4} {encoding:>9} {built - start:>10.2f} {solved - built:>10.2f} {deviation:>10.2f} {preference:>11.2f}")
+
+if __name__ == "__main__":
+    main()
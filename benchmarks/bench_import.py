@@ -0,0 +1,71 @@
+"""
+Benchmarks how long the scheduling modules take to import in a fresh interpreter,
+and guards against heavy dependencies being imported before they are used.
+
+Each module is imported in its own process several times; the median time is reported.
+Exits with an error if a module pulls in a deferred dependency, or is slower than --max-seconds.
+
+Run from the repository root:
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --repeat 10 --max-seconds 0.5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Dependencies that are only imported once they are needed (e.g. ortools when a model is built)
+DEFERRED = ["streamlit", "ortools", "dateparser", "pandas"]
+
+# Modules on the headless scheduling path, and the deferred dependencies each is allowed to import
+MODULES = {
+    "modules.dtypes":     [],
+    "modules.cache":      [],
+    "modules.solver":     [],
+    "modules.parse_data": [],
+    "modules.cli":        [],
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+def measure(module:str) -> dict:
+    """Imports a module in a fresh interpreter. Returns the import time and the deferred dependencies it loaded."""
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, deferred=DEFERRED)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if a module's median import time is above this")
+    args = parser.parse_args()
+    
+    failures = []
+    print(f"{'module':<20} {'median (s)':>10} {'min (s)':>8}  loaded")
+    for module, allowed in MODULES.items():
+        results = [measure(module) for _ in range(args.repeat)]
+        times = [result["seconds"] for result in results]
+        loaded = sorted(set(name for result in results for name in result["loaded"]))
+        print(f"{module:<20} {statistics.median(times):>10.3f} {min(times):>8.3f}  {', '.join(loaded) or '-'}")
+        
+        unexpected = [name for name in loaded if name not in allowed]
+        if unexpected:
+            failures.append(f"{module} imports {', '.join(unexpected)} at import time")
+        if args.max_seconds != None and statistics.median(times) > args.max_seconds:
+            failures.append(f"{module} takes {statistics.median(times):.3f}s to import (limit {args.max_seconds}s)")
+    
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmarks parsing the three input CSVs.
+
+A synthetic availability report, shifts to fill and preferences are generated once,
+written to CSV and read back (so cells are the strings a real export holds),
+then parsed repeatedly. Reports the best time of each parser and its throughput.
+
+Run from the repository root:
+    python -m benchmarks.bench_parse
+    python -m benchmarks.bench_parse --employees 1000 --days 60 --repeat 3
+"""
+import argparse
+import io
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from modules.gen_synth_data import generate_data
+import modules.parse_data as parse_data
+
+def load_csvs(employee_count:int, days:int, seed:int) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Generates synthetic inputs and round-trips them through CSV. Returns (availability_report, to_fill, preferences)."""
+    start_date = date(2025, 1, 6)
+    names = [f"Employee {i}" for i in range(employee_count)]
+    frames = generate_data(start_date, start_date + timedelta(days=days - 1), names=names, seed=seed)
+    return tuple(pd.read_csv(io.StringIO(frame.to_csv(index=False))) for frame in frames)
+
+def best_time(func, repeat:int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    availability_report, to_fill, preferences = load_csvs(args.employees, args.days, args.seed)
+    print(f"generated {args.employees} employees x {args.days} days in {time.perf_counter() - start:.1f}s")
+    
+    employees = parse_data.parse_employees(preferences)
+    cells = int(availability_report.iloc[:, 2:].notna().sum().sum())
+    cases = [
+        ("parse_employees",    lambda: parse_data.parse_employees(preferences),                        len(preferences), "employees"),
+        ("parse_availability", lambda: parse_data.parse_availability(availability_report, employees), cells,             "cells"),
+        ("parse_to_fill",      lambda: parse_data.parse_to_fill(to_fill),                              len(to_fill),     "rows"),
+    ]
+    
+    print(f"{'parser':<20} {'best (s)':>9} {'throughput':>22}")
+    for name, func, count, unit in cases:
+        seconds = best_time(func, args.repeat)
+        print(f"{name:<20} {seconds:>9.3f} {count / seconds:>14,.0f} {unit}/s")
+
+if __name__ == "__main__":
+    main()
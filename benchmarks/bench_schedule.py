@@ -0,0 +1,145 @@
+"""
+Benchmarks scheduling over synthetic workloads.
+
+Every combination of the given employee counts, position counts, horizons and seeds
+is parsed and scheduled with create_schedule (uncached) in a fresh process, and the results are written to JSON
+so runs of different versions can be compared. Build and solve times are read from its ScheduleStats.
+
+Run from the repository root:
+    python -m benchmarks.bench_schedule --employees 10 50 --weeks 1 4 --output bench.json
+    python -m benchmarks.bench_schedule --employees 10 50 --weeks 1 4 --compare bench.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+
+import ortools
+
+from modules.gen_synth_data import generate_data, positions as default_positions
+import modules.parse_data as parse_data
+import modules.solver as solver
+
+def position_names(count:int) -> list[str]:
+    """The synthetic data's positions, extended with generic ones if more are needed."""
+    return (default_positions + [f"Position {i}" for i in range(len(default_positions) + 1, count + 1)])[:count]
+
+def load_problem(employee_count:int, weeks:int, seed:int, position_count:int=2):
+    """Generates and parses a synthetic problem. Returns (to_schedule, employees)."""
+    start_date = date(2025, 1, 6) # A monday, so the horizon is made of whole ISO weeks
+    end_date = start_date + timedelta(weeks=weeks, days=-1)
+    names = [f"Employee {i}" for i in range(employee_count)]
+    availability_report, to_fill, preferences = generate_data(
+        start_date, end_date, names=names, seed=seed, positions=position_names(position_count)
+    )
+    
+    employees = parse_data.parse_employees(preferences)
+    parse_data.parse_availability(availability_report, employees)
+    return parse_data.parse_to_fill(to_fill), employees
+
+# Phases of ScheduleStats.phase_times that are not building the model
+SEARCH_PHASES = ("precheck", "greedy", "hint", "solve")
+
+def parse_horizon(value:str):
+    return value if value == "week" else int(value)
+
+def run_case(employees:int, positions:int, weeks:int, seed:int, solver_max_time:float, availability:str, schedule_args:dict) -> dict:
+    """Runs one benchmark case. Meant to be run in its own process so peak memory is per case."""
+    result = dict(employees=employees, positions=positions, weeks=weeks, seed=seed, solver_max_time=solver_max_time, availability=availability, **schedule_args)
+    
+    start = time.perf_counter()
+    to_schedule, employee_data = load_problem(employees, weeks, seed, positions)
+    result["parse_time"] = time.perf_counter() - start
+    result["rows_to_schedule"] = len(to_schedule)
+    
+    hard_availability, soft_availability_fallback = {"hard": (True, False), "soft": (False, False), "fallback": (True, True)}[availability]
+    start = time.perf_counter()
+    schedule, stats = solver.create_schedule.__wrapped__(
+        to_schedule, employee_data, solver_max_time=solver_max_time, solver_seed=seed, return_stats=True,
+        hard_availability=hard_availability, soft_availability_fallback=soft_availability_fallback, **schedule_args
+    )
+    result["total_time"] = time.perf_counter() - start
+    
+    result["build_time"] = sum(seconds for phase, seconds in stats.phase_times.items() if phase not in SEARCH_PHASES)
+    result["solve_time"] = stats.phase_times.get("hint", 0.0) + stats.phase_times.get("solve", 0.0)
+    result["precheck_time"] = stats.phase_times.get("precheck", 0.0)
+    result["greedy_time"] = stats.phase_times.get("greedy", 0.0)
+    result["hard_availability"] = stats.hard_availability
+    result["variables"] = sum(stats.variable_counts.values())
+    result["shift_variables"] = stats.variable_counts.get("shift variables", 0)
+    result["constraints"] = sum(stats.constraint_counts.values())
+    result["status"] = stats.status or ("NO_SHIFTS" if schedule == None else "UNKNOWN")
+    result["scheduled"] = schedule != None
+    if stats.objective != None:
+        result["objective"] = stats.objective
+        result["best_bound"] = stats.best_bound
+    
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_memory_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+def compare(results:list[dict], baseline:list[dict]):
+    """Prints the change of each metric relative to a baseline run with the same parameters."""
+    params = ("employees", "positions", "weeks", "seed", "availability", "horizon", "quick")
+    baseline_by_params = {tuple(r.get(p) for p in params): r for r in baseline}
+    
+    print(f"{'employees':>9} {'positions':>9} {'weeks':>5} {'seed':>4} {'build':>8} {'solve':>8} {'memory':>8} {'objective':>14}")
+    for result in results:
+        old = baseline_by_params.get(tuple(result.get(p) for p in params))
+        if old == None:
+            continue
+        
+        ratio = lambda key: f"{result[key] / old[key]:.2f}x" if old.get(key) and key in result else "-"
+        objective = f"{result['objective'] - old['objective']:+.1f}" if "objective" in result and "objective" in old else "-"
+        print(f"{result['employees']:>9} {result['positions']:>9} {result['weeks']:>5} {result['seed']:>4} {ratio('build_time'):>8} {ratio('solve_time'):>8} {ratio('peak_memory_mb'):>8} {objective:>14}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--positions", type=int, nargs="+", default=[2])
+    parser.add_argument("--weeks", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1])
+    parser.add_argument("--time", type=float, default=10, help="solver time limit in seconds")
+    parser.add_argument("--availability", choices=["hard", "soft", "fallback"], default="fallback")
+    parser.add_argument("--horizon", type=parse_horizon, default=None, help='solve one window at a time: "week" or a number of days')
+    parser.add_argument("--repair", action="store_true", help="with --horizon, re-solve around window boundaries")
+    parser.add_argument("--quick", action="store_true", help="only build a greedy draft schedule, without the solver")
+    parser.add_argument("--no-decompose", action="store_true", help="solve positions that share no employees as one model")
+    parser.add_argument("--no-greedy-seed", action="store_true", help="start the solver without a greedy schedule")
+    parser.add_argument("--label", default="", help="a name for this run, e.g. a version or commit")
+    parser.add_argument("--output", help="JSON file to write results to")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare against")
+    args = parser.parse_args()
+    schedule_args = dict(horizon=args.horizon, repair=args.repair, quick=args.quick, decompose=not args.no_decompose, greedy_seed=not args.no_greedy_seed)
+    
+    results = []
+    cases = itertools.product(args.employees, args.positions, args.weeks, args.seeds)
+    print(f"{'employees':>9} {'positions':>9} {'weeks':>5} {'seed':>4} {'build (s)':>10} {'solve (s)':>10} {'variables':>10} {'constraints':>11} {'memory (MB)':>11} {'status':>10}")
+    for employees, positions, weeks, seed in cases:
+        # A fresh process per case keeps peak memory and caches from leaking between cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(run_case, employees, positions, weeks, seed, args.time, args.availability, schedule_args).result()
+        results.append(result)
+        print(f"{employees:>9} {positions:>9} {weeks:>5} {seed:>4} {result['build_time']:>10.2f} {result['solve_time']:>10.2f} {result.get('variables', 0):>10} {result.get('constraints', 0):>11} {result['peak_memory_mb']:>11.0f} {result['status']:>10}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "label": args.label,
+                "created": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "ortools": ortools.__version__,
+                "results": results,
+            }, f, indent=2)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+if __name__ == "__main__":
+    main()
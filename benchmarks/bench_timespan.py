@@ -0,0 +1,89 @@
+"""
+Benchmarks the span types the solver creates, hashes and compares most often:
+datetime-backed Timespans against integer-backed MinuteSpans.
+
+Random shift-like spans are created, used as dict keys, measured and compared for overlap,
+and the memory each type needs is measured. Reports the best time of each operation.
+
+Run from the repository root:
+    python -m benchmarks.bench_timespan
+    python -m benchmarks.bench_timespan --count 200000 --repeat 5
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from modules.dtypes import Timespan, MinuteSpan, from_minutes, MINUTES_PER_DAY
+
+def random_bounds(count:int, seed:int) -> list[tuple[int, int]]:
+    """Minute bounds of shifts of 2-5 hours on the half hour, over a year."""
+    rng = random.Random(seed)
+    bounds = []
+    for _ in range(count):
+        start = rng.randrange(365) * MINUTES_PER_DAY + rng.randrange(8 * 2, 18 * 2) * 30
+        bounds.append((start, start + rng.randrange(2 * 2, 5 * 2 + 1) * 30))
+    return bounds
+
+def best_time(func, repeat:int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def memory(func) -> int:
+    """Bytes still allocated by the result of func."""
+    tracemalloc.start()
+    result = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="spans per run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    bounds = random_bounds(args.count, args.seed)
+    moments = [(from_minutes(start), from_minutes(end)) for start, end in bounds]
+    timespans = [Timespan(start, end) for start, end in moments]
+    minutespans = [MinuteSpan(start, end) for start, end in bounds]
+    
+    def index(spans):
+        counts = {}
+        for span in spans:
+            counts[span] = counts.get(span, 0) + 1
+        return counts
+    
+    def overlaps(spans):
+        return sum(a.overlaps_with(b) for a, b in zip(spans, spans[1:]))
+    
+    def span_key(span):
+        return (span.start, span.end)
+    
+    cases = [
+        ("create",   lambda: [Timespan(start, end) for start, end in moments],    lambda: [MinuteSpan(start, end) for start, end in bounds]),
+        ("hash",     lambda: index(timespans),                                    lambda: index(minutespans)),
+        ("length",   lambda: [span.length for span in timespans],                 lambda: [span.length for span in minutespans]),
+        ("overlaps", lambda: overlaps(timespans),                                 lambda: overlaps(minutespans)),
+        ("sort",     lambda: sorted(timespans, key=span_key),                     lambda: sorted(minutespans, key=span_key)),
+    ]
+    
+    print(f"{args.count:,} spans")
+    print(f"{'operation':<10} {'Timespan (s)':>13} {'MinuteSpan (s)':>15} {'speedup':>8}")
+    for name, timespan_func, minutespan_func in cases:
+        timespan_seconds = best_time(timespan_func, args.repeat)
+        minutespan_seconds = best_time(minutespan_func, args.repeat)
+        print(f"{name:<10} {timespan_seconds:>13.3f} {minutespan_seconds:>15.3f} {timespan_seconds / minutespan_seconds:>7.1f}x")
+    
+    timespan_bytes = memory(lambda: [Timespan(from_minutes(start), from_minutes(end)) for start, end in bounds])
+    minutespan_bytes = memory(lambda: [MinuteSpan(start, end) for start, end in bounds])
+    print(f"{'memory':<10} {timespan_bytes / args.count:>11.0f} B {minutespan_bytes / args.count:>13.0f} B {timespan_bytes / minutespan_bytes:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
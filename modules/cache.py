@@ -0,0 +1,221 @@
+import hashlib
+import importlib.util
+import inspect
+import os
+import pickle
+import tempfile
+import warnings
+from dataclasses import dataclass
+from datetime import date, time, datetime, timedelta
+from functools import wraps
+from pathlib import Path
+from types import CodeType, FunctionType, MethodType, BuiltinFunctionType
+
+import numpy as np
+
+CACHE_DIR_VARIABLE = "EMPLOYEE_SCHEDULER_CACHE_DIR"
+
+def _state(obj):
+    """
+    The instance state of obj: what its class's own __getstate__ returns,
+    or else its attributes and slots (object.__getstate__ only exists from Python 3.11).
+    """
+    getstate = getattr(type(obj), "__getstate__", None)
+    if getstate != None and getstate is not getattr(object, "__getstate__", None):
+        return getstate(obj)
+    
+    state = dict(vars(obj)) if hasattr(obj, "__dict__") else dict()
+    for cls in type(obj).__mro__:
+        slots = getattr(cls, "__slots__", ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if name not in ("__dict__", "__weakref__") and hasattr(obj, name):
+                state[name] = getattr(obj, name)
+    return state
+
+def _update_subclass(hasher, obj, base:type):
+    """Encodes the class and instance state of a subclass of a builtin container (e.g. AveragePreference's weights)."""
+    if type(obj) is not base:
+        hasher.update(b"subclass:%s.%s:" % (type(obj).__module__.encode(), type(obj).__qualname__.encode()))
+        _update(hasher, _state(obj))
+
+def _update(hasher, obj):
+    """Feeds a canonical encoding of obj into hasher. Equal values always encode the same."""
+    # Every value is prefixed with a type tag, so e.g. 1, 1.0, "1" and (1,) all differ
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes)) and not isinstance(obj, np.generic):
+        hasher.update(b"%s:%s;" % (type(obj).__name__.encode(), repr(obj).encode()))
+    
+    elif isinstance(obj, np.generic):
+        _update(hasher, obj.item())
+    
+    elif isinstance(obj, (datetime, date, time, timedelta)):
+        hasher.update(b"%s:%s;" % (type(obj).__name__.encode(), str(obj).encode()))
+    
+    elif isinstance(obj, np.ndarray):
+        hasher.update(b"ndarray:%s:%s:" % (obj.dtype.str.encode(), str(obj.shape).encode()))
+        hasher.update(np.ascontiguousarray(obj).tobytes())
+    
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(b"%s:%d[" % (type(obj).__name__.encode(), len(obj)))
+        for item in obj:
+            _update(hasher, item)
+        hasher.update(b"]")
+        _update_subclass(hasher, obj, tuple if isinstance(obj, tuple) else list)
+    
+    elif isinstance(obj, (set, frozenset)):
+        # Unordered, so items are encoded in the order of their own fingerprints
+        hasher.update(b"set:%d[" % len(obj))
+        for digest in sorted(fingerprint(item) for item in obj):
+            hasher.update(digest.encode())
+        hasher.update(b"]")
+    
+    elif isinstance(obj, dict):
+        hasher.update(b"dict:%d{" % len(obj))
+        for key_digest, value in sorted(((fingerprint(key), value) for key, value in obj.items()), key=lambda item: item[0]):
+            hasher.update(key_digest.encode())
+            _update(hasher, value)
+        hasher.update(b"}")
+        _update_subclass(hasher, obj, dict)
+    
+    elif isinstance(obj, FunctionType):
+        # Functions (including lambdas) are hashed by what they do, not by identity
+        hasher.update(b"function:")
+        _update(hasher, obj.__code__)
+        _update(hasher, obj.__defaults__)
+        _update(hasher, tuple(cell.cell_contents for cell in obj.__closure__ or ()))
+    
+    elif isinstance(obj, CodeType):
+        hasher.update(b"code:%s:" % obj.co_code)
+        _update(hasher, obj.co_consts)
+        _update(hasher, obj.co_names)
+    
+    elif isinstance(obj, (MethodType, BuiltinFunctionType, type)):
+        hasher.update(b"%s:%s.%s;" % (type(obj).__name__.encode(), str(obj.__module__).encode(), obj.__qualname__.encode()))
+    
+    else:
+        # Other objects (dataclasses, preferences, availability) are their class and pickled state
+        hasher.update(b"object:%s.%s:" % (type(obj).__module__.encode(), type(obj).__qualname__.encode()))
+        _update(hasher, _state(obj))
+
+def fingerprint(*values) -> str:
+    """A stable hex digest of values, which is equal for equal inputs across processes and restarts."""
+    hasher = hashlib.sha256()
+    _update(hasher, values)
+    return hasher.hexdigest()
+
+def source_fingerprint(*module_names:str) -> str:
+    """
+    A digest of the source of the named modules, found without importing them.
+    Used as the version of cached results that depend on those modules.
+    """
+    sources = []
+    for name in module_names:
+        spec = importlib.util.find_spec(name)
+        try:
+            sources.append(Path(spec.origin).read_bytes())
+        except (AttributeError, OSError, TypeError):
+            sources.append(name.encode())
+    return fingerprint(module_names, sources)
+
+@dataclass
+class DiskCache:
+    """
+    A directory of pickled values keyed by fingerprint.
+    When the directory grows past max_bytes, the least recently used entries are evicted.
+    
+    The directory defaults to $EMPLOYEE_SCHEDULER_CACHE_DIR, or ~/.cache/employee_scheduler.
+    """
+    directory: Path = None
+    max_bytes: int  = 256 * 1024 * 1024
+    
+    def __post_init__(self):
+        if self.directory == None:
+            self.directory = os.environ.get(CACHE_DIR_VARIABLE) or Path.home() / ".cache" / "employee_scheduler"
+        self.directory = Path(self.directory)
+    
+    def _path(self, key:str) -> Path:
+        return self.directory / f"{key}.pickle"
+    
+    def get(self, key:str, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path) # Entries are evicted by modification time, so mark this one as recently used
+            return value
+        except FileNotFoundError:
+            return default
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            warnings.warn(f"Ignoring unreadable cache entry {path}: {e}")
+            return default
+    
+    def set(self, key:str, value):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first, so concurrent readers never see a partial entry
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, self._path(key))
+            self.evict()
+        except OSError as e:
+            warnings.warn(f"Could not write to the cache in {self.directory}: {e}")
+    
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.directory.glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+    
+    def clear(self):
+        for path in self.directory.glob("*.pickle"):
+            path.unlink(missing_ok=True)
+
+def persistent_cache(cache:DiskCache=None, store_if=lambda result: True, dependencies:tuple[str, ...]=()):
+    """
+    Caches a function's results on disk, keyed by the fingerprint of its arguments.
+    Arguments are normalized first, so passing a default explicitly or by keyword hits the same entry.
+    The source of the function's module, and of the modules named in dependencies,
+    is part of the key, so changing any of them invalidates old entries.
+    
+    Only results for which store_if is true are stored.
+    The uncached function is available as __wrapped__, and the cache as cache.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        try:
+            source = Path(inspect.getsourcefile(func)).read_bytes()
+        except (OSError, TypeError):
+            source = func.__code__.co_code
+        version = fingerprint(func.__module__, func.__qualname__, source, source_fingerprint(*dependencies))
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = wrapper.cache
+            if cache == None:
+                cache = wrapper.cache = DiskCache()
+            
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            key = fingerprint(version, arguments.arguments)
+            
+            missing = object()
+            result = cache.get(key, missing)
+            if result is missing:
+                result = func(*args, **kwargs)
+                if store_if(result):
+                    cache.set(key, result)
+            return result
+        
+        wrapper.cache = cache
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+"""
+Schedules shifts without the web interface.
+
+Each site is a directory holding preferences.csv, availability_report.csv and to_fill.csv
+(the same files the app uploads). The schedule is written next to them as a CSV that can be
+imported into Humanity. Given a directory without these files, every subdirectory that has them
+is scheduled as its own site, several at a time.
+
+    python scheduler.py                      # the current directory is the site
+    python scheduler.py sites/ --jobs 4      # every site in sites/
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import modules.parse_data as parse_data
+import modules.solver as solver
+
+PREFERENCES_FILE  = "preferences.csv"
+AVAILABILITY_FILE = "availability_report.csv"
+TO_FILL_FILE      = "to_fill.csv"
+
+def is_site(path:Path) -> bool:
+    return all((path / name).is_file() for name in (PREFERENCES_FILE, AVAILABILITY_FILE, TO_FILL_FILE))
+
+def find_sites(paths:list[Path]) -> list[Path]:
+    """Expands the given paths into site directories."""
+    sites = []
+    for path in paths:
+        if is_site(path):
+            sites.append(path)
+            continue
+        
+        subsites = sorted(subpath for subpath in path.iterdir() if subpath.is_dir() and is_site(subpath)) if path.is_dir() else []
+        if len(subsites) == 0:
+            raise FileNotFoundError(f"{path} has no {PREFERENCES_FILE}, {AVAILABILITY_FILE} and {TO_FILL_FILE}, nor any subdirectories with them")
+        sites.extend(subsites)
+    return sites
+
+def schedule_site(site:Path, output:str, use_cache:bool, schedule_args:dict) -> tuple[bool, str]:
+    """Schedules one site and writes its schedule. Returns whether it succeeded, and a summary."""
+    import pandas as pd
+    
+    start = time.perf_counter()
+    employees = parse_data.parse_employees(pd.read_csv(site / PREFERENCES_FILE))
+    parse_data.parse_availability(pd.read_csv(site / AVAILABILITY_FILE), employees)
+    to_fill = parse_data.parse_to_fill(pd.read_csv(site / TO_FILL_FILE))
+    
+    create_schedule = solver.create_schedule if use_cache else solver.create_schedule.__wrapped__
+    schedule, stats = create_schedule(to_fill, employees, return_stats=True, **schedule_args)
+    elapsed = time.perf_counter() - start
+    if schedule == None:
+        summary = f"{site}: failed to schedule {len(to_fill)} shifts for {len(employees)} employees ({elapsed:.1f}s)"
+        # Explain the failure when the solver's pre-check found the staffing insufficient
+        if stats.feasibility != None and not stats.feasibility.feasible:
+            summary += f"\n{stats.feasibility}"
+        return False, summary
+    
+    output_path = site / output
+    parse_data.export_schedule(schedule).to_csv(output_path, index=False)
+    return True, f"{site}: scheduled {len(schedule)} shifts for {len(employees)} employees into {output_path} ({elapsed:.1f}s)"
+
+def site_error(site:Path, error:Exception) -> tuple[bool, str]:
+    """The result of a site whose input could not be read or scheduled, so the other sites still run."""
+    return False, f"{site}: failed with {type(error).__name__}: {error}"
+
+def parse_horizon(value:str):
+    return value if value == "week" else int(value)
+
+def main(argv:list[str]=None) -> int:
+    parser = argparse.ArgumentParser(prog="scheduler", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sites", type=Path, nargs="*", default=[Path(".")], help="site directories, or directories of sites")
+    parser.add_argument("-o", "--output", default="schedule.csv", help="file name of the schedule written into each site")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="sites to schedule at once")
+    parser.add_argument("--time", type=float, default=10, help="solver time limit in seconds, for each site as a whole")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-hours", type=int, default=18, help="max hours per week")
+    parser.add_argument("--shift-lengths", type=int, nargs="+", default=[3, 4], help="shift lengths in hours")
+    parser.add_argument("--max-shifts-per-day", type=int, default=1)
+    parser.add_argument("--min-one-shift", action="store_true", help="require at least one shift per employee")
+    parser.add_argument("--allow-unavailable", action="store_true", help="allow (but penalize) shifts outside of availability from the start")
+    parser.add_argument("--horizon", type=parse_horizon, default=None, help='solve one window at a time: "week" or a number of days')
+    parser.add_argument("--repair", action="store_true", help="with --horizon, re-solve around window boundaries")
+    parser.add_argument("--quick", action="store_true", help="only build a greedy draft schedule, without the solver")
+    parser.add_argument("--no-cache", action="store_true", help="always solve, ignoring cached schedules")
+    args = parser.parse_args(argv)
+    
+    try:
+        sites = find_sites(args.sites)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    
+    jobs = max(1, min(args.jobs, len(sites)))
+    schedule_args = dict(
+        solver_max_time=args.time,
+        solver_seed=args.seed,
+        max_hours_per_week=args.max_hours,
+        shift_lengths=args.shift_lengths,
+        max_shifts_per_day=args.max_shifts_per_day,
+        min_one_shift_per_employee=args.min_one_shift,
+        hard_availability=not args.allow_unavailable,
+        horizon=args.horizon,
+        repair=args.repair,
+        quick=args.quick,
+        # Sites already run in parallel, so each solves its parts one after another on its share of the cores
+        max_workers=1 if jobs > 1 else None,
+        num_workers=max(1, (os.cpu_count() or 1) // jobs) if jobs > 1 else 0,
+    )
+    
+    failures = 0
+    if jobs == 1:
+        for site in sites:
+            try:
+                succeeded, summary = schedule_site(site, args.output, not args.no_cache, schedule_args)
+            except Exception as e:
+                succeeded, summary = site_error(site, e)
+            failures += not succeeded
+            print(summary)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(schedule_site, site, args.output, not args.no_cache, schedule_args) for site in sites]
+            for site, future in zip(sites, futures):
+                try:
+                    succeeded, summary = future.result()
+                except Exception as e:
+                    succeeded, summary = site_error(site, e)
+                failures += not succeeded
+                print(summary)
+    
+    if failures > 0:
+        print(f"{failures} of {len(sites)} sites failed to schedule.", file=sys.stderr)
+    return 1 if failures > 0 else 0
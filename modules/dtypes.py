@@ -1,7 +1,26 @@
 from datetime import datetime, timedelta, time, date
 from dataclasses import dataclass, field
+from functools import cache
+from importlib import import_module
 import warnings
 from textwrap import indent
+import numpy as np
+
+# Batch APIs represent points in time as integer minutes since this epoch (a Monday)
+MINUTE_EPOCH = datetime(2000, 1, 3)
+MINUTES_PER_DAY = 24 * 60
+
+def to_minutes(moment:datetime) -> int:
+    """Converts a datetime to whole minutes since MINUTE_EPOCH."""
+    return (moment - MINUTE_EPOCH) // timedelta(minutes=1)
+
+def from_minutes(minutes:int) -> datetime:
+    """Converts minutes since MINUTE_EPOCH back to a datetime."""
+    return MINUTE_EPOCH + timedelta(minutes=int(minutes))
+
+def time_to_minutes(moment:time) -> int:
+    """Converts a time of day to whole minutes since midnight."""
+    return moment.hour * 60 + moment.minute
 
 @dataclass(frozen=True)
 class Timespan(object):
@@ -53,8 +72,8 @@ class Timespan(object):
         if isinstance(self.start, datetime):
             return self.end - self.start
         if isinstance(self.start, time):
-            start = datetime.combine(datetime.now(), self.start)
-            end = datetime.combine(datetime.now(), self.end)
+            start = datetime.combine(MINUTE_EPOCH, self.start)
+            end = datetime.combine(MINUTE_EPOCH, self.end)
             return end - start
         
     def __repr__(self):
@@ -125,8 +144,8 @@ class Timespan(object):
             if isinstance(self.start, time):
                 # addition between time and timedelta is not natively supported
                 # cast to datetime then cast back to time
-                my_start = datetime.combine(datetime.now(), self.start) + other
-                my_end = datetime.combine(datetime.now(), self.end) + other
+                my_start = datetime.combine(MINUTE_EPOCH, self.start) + other
+                my_end = datetime.combine(MINUTE_EPOCH, self.end) + other
                 return Timespan(my_start.time(), my_end.time())
         
         # Add start and end of timespan
@@ -156,12 +175,176 @@ class Timespan(object):
             return Timespan(min(self.start, other_start), max(self.end, other_end))
         
         raise TypeError("Cannot add %r to Timespan." % type(other))
+
+class MinuteSpan(object):
+    """
+    A compact Timespan for the solver's hot path: start and end are integer minutes
+    since MINUTE_EPOCH, both inclusive. Treated as immutable, and hashed once.
+    Convert with from_timespan and to_timespan at the public boundary.
+    """
+    __slots__ = ('start', 'end', '_hash')
+
+    def __init__(self, start:int, end:int):
+        if start > end:
+            raise ValueError(f"Start  must be before end (start: {start}; end: {end}).")
+        self.start = start
+        self.end = end
+        self._hash = hash((start, end))
+
+    @staticmethod
+    def from_timespan(timespan:Timespan) -> 'MinuteSpan':
+        return MinuteSpan(to_minutes(timespan.start), to_minutes(timespan.end))
+
+    def to_timespan(self) -> Timespan:
+        return Timespan(from_minutes(self.start), from_minutes(self.end))
+
+    @property
+    def length(self) -> int:
+        """The length in minutes."""
+        return self.end - self.start
+
+    @property
+    def day(self) -> int:
+        """The day the span starts on, in days since MINUTE_EPOCH. As the epoch is a Monday, day % 7 is the weekday."""
+        return self.start // MINUTES_PER_DAY
+
+    @property
+    def date(self) -> date:
+        return MINUTE_EPOCH.date() + timedelta(days=self.day)
+
+    def overlaps_with(self, other:'MinuteSpan') -> bool:
+        return max(self.start, other.start) < min(self.end, other.end)
+
+    def __contains__(self, other):
+        if isinstance(other, MinuteSpan):
+            return self.start <= other.start and other.end <= self.end
+        return self.start <= other <= self.end
+
+    def __eq__(self, other):
+        if not isinstance(other, MinuteSpan):
+            return False
+        return self.start == other.start and self.end == other.end
+
+    def __hash__(self):
+        return self._hash
+
+    def __lt__(self, other:'MinuteSpan'):
+        return (self.start, self.end) < (other.start, other.end)
+
+    def __reduce__(self):
+        return (MinuteSpan, (self.start, self.end))
+
+    def __repr__(self):
+        return "MinuteSpan(%r, %r)" % (self.start, self.end)
+
+class Availability():
+    """
+    The times an employee is available, stored as sorted, merged intervals
+    of minutes since MINUTE_EPOCH for O(log n) containment checks.
+    
+    Like Timespans, intervals are inclusive (at minute resolution),
+    so windows that touch or are a minute apart merge into one.
+    """
+    
+    def __init__(self, timespans=()):
+        timespans = list(timespans)
+        starts = np.fromiter((to_minutes(ts.start) for ts in timespans), dtype=np.int64, count=len(timespans))
+        ends   = np.fromiter((to_minutes(ts.end)   for ts in timespans), dtype=np.int64, count=len(timespans))
+        self.starts, self.ends = Availability.merge(starts, ends)
+    
+    @staticmethod
+    def merge(starts:np.ndarray, ends:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Sorts minute intervals and merges those that overlap, touch or are a minute apart."""
+        if len(starts) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        
+        order = np.lexsort((ends, starts))
+        starts, ends = starts[order], ends[order]
+        
+        # An interval begins a new merged interval unless it starts within a minute of the furthest end before it
+        reach = np.maximum.accumulate(ends)
+        begins = np.ones(len(starts), dtype=bool)
+        begins[1:] = starts[1:] > reach[:-1] + 1
+        first = np.flatnonzero(begins)
+        return starts[first], np.maximum.reduceat(ends, first)
+    
+    @staticmethod
+    def from_minutes(starts:np.ndarray, ends:np.ndarray) -> 'Availability':
+        """Creates an Availability from minute intervals in any order, merging them."""
+        starts, ends = Availability.merge(np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+        return Availability.from_intervals(starts, ends)
+    
+    @staticmethod
+    def from_intervals(starts:np.ndarray, ends:np.ndarray) -> 'Availability':
+        """Creates an Availability from already sorted and merged minute intervals."""
+        availability = Availability()
+        availability.starts = np.asarray(starts, dtype=np.int64)
+        availability.ends   = np.asarray(ends, dtype=np.int64)
+        return availability
+    
+    def __reduce__(self):
+        # Reduce to the class and plain state only, which Streamlit's cache can hash
+        return (Availability, (), {'starts': self.starts, 'ends': self.ends})
+    
+    def contains(self, start:int, end:int) -> bool:
+        """Checks if the minutes start to end are entirely within one available interval."""
+        i = int(np.searchsorted(self.starts, start, side='right')) - 1
+        return i >= 0 and end <= self.ends[i]
+    
+    def contains_batch(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        """Vectorized contains. Returns a boolean array with one entry per interval."""
+        indices = np.searchsorted(self.starts, starts, side='right') - 1
+        if len(self.starts) == 0:
+            return np.zeros(len(indices), dtype=bool)
+        return (indices >= 0) & (ends <= self.ends[np.maximum(indices, 0)])
     
+    def union(self, other) -> 'Availability':
+        return Availability(list(self) + list(other))
+
+    def clip(self, start:int, end:int) -> 'Availability':
+        """The available intervals cut to the minutes start to end."""
+        overlapping = (self.starts <= end) & (self.ends >= start)
+        return Availability.from_intervals(np.maximum(self.starts[overlapping], start), np.minimum(self.ends[overlapping], end))
+
+    def __contains__(self, other):
+        if not isinstance(other, Timespan):
+            raise TypeError("Cannot check containment with %r." % type(other))
+        if not isinstance(other.start, datetime):
+            return False
+        return self.contains(to_minutes(other.start), to_minutes(other.end))
+    
+    def __iter__(self):
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            yield Timespan(from_minutes(start), from_minutes(end))
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def __eq__(self, other):
+        if not isinstance(other, Availability):
+            return False
+        return np.array_equal(self.starts, other.starts) and np.array_equal(self.ends, other.ends)
+    
+    def __repr__(self):
+        return "Availability(%r)" % list(self)
 
 class Preferences():
     """A class to store and manage employee preferences."""
     def get_shift_preference(self, shift:Timespan) -> float:
         raise NotImplementedError
+    
+    def get_shift_preferences(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        """
+        Scores many shifts at once. Shifts are given as int64 arrays of start and end
+        minutes since MINUTE_EPOCH. Returns a float array with one preference per shift.
+        
+        Subclasses should override this with a vectorized implementation;
+        by default each shift is scored individually.
+        """
+        return np.fromiter(
+            (self.get_shift_preference(Timespan(from_minutes(start), from_minutes(end))) for start, end in zip(starts, ends)),
+            dtype=np.float64, count=len(starts)
+        )
 
 class AveragePreference(list[Preferences], Preferences):
     """Returns the average preference of multiple preferences."""
@@ -182,6 +365,18 @@ class AveragePreference(list[Preferences], Preferences):
         else:
             raise ValueError("Number of weights must match number of preferences.")
     
+    def get_shift_preferences(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        if len(self) == 0: return np.zeros(len(starts))
+        
+        if len(self.weights) == 0:
+            total_preferences = sum(p.get_shift_preferences(starts, ends) for p in self)
+            return total_preferences / len(self)
+        elif len(self) == len(self.weights):
+            total_preferences = sum(w * p.get_shift_preferences(starts, ends) for w, p in zip(self.weights, self))
+            return total_preferences / sum(self.weights)
+        else:
+            raise ValueError("Number of weights must match number of preferences.")
+    
     def append(self, p: Preferences, weight: float = 1.0):
         super().append(p)
         self.weights.append(weight)
@@ -192,6 +387,10 @@ class MaxPreference(list[Preferences], Preferences):
     def get_shift_preference(self, shift: Timespan) -> float:
         if len(self) == 0: return 0.0
         return max(p.get_shift_preference(shift) for p in self)
+    
+    def get_shift_preferences(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        if len(self) == 0: return np.zeros(len(starts))
+        return np.max([p.get_shift_preferences(starts, ends) for p in self], axis=0)
 
 @dataclass()
 class LengthPreference(Preferences):
@@ -201,10 +400,38 @@ class LengthPreference(Preferences):
     def get_shift_preference(self, shift: Timespan) -> float:
         return float(self.length_condition(shift.length))
     
+    def get_shift_preferences(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        # Shifts come in a handful of distinct lengths, so only evaluate the condition once per length
+        lengths, inverse = np.unique(ends - starts, return_inverse=True)
+        satisfied = np.array([float(self.length_condition(timedelta(minutes=int(length)))) for length in lengths])
+        return satisfied[inverse.reshape(-1)]
+    
 class SpecificTODPreference(list[Timespan], Preferences):
-    """Returns 1 IFF a shift is entirely within a preferred time of day."""
+    """
+    Returns 1 IFF a shift is entirely within a preferred time of day.
+    Timespans without a date match the shift's time of day on any day.
+    """
     def get_shift_preference(self, shift: Timespan) -> float:
-        return float(any(shift in timespan for timespan in self))
+        return float(any(
+            (shift.strip_date() if isinstance(timespan.start, time) and isinstance(shift.start, datetime) else shift) in timespan
+            for timespan in self
+        ))
+    
+    def get_shift_preferences(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        satisfied = np.zeros(len(starts), dtype=bool)
+        if len(self) == 0: return satisfied.astype(np.float64)
+        
+        # Shifts never cross midnight, so their time of day is a plain offset into their start day
+        day_starts = starts - starts % MINUTES_PER_DAY
+        for timespan in self:
+            if isinstance(timespan.start, time):
+                lower = day_starts + time_to_minutes(timespan.start)
+                upper = day_starts + time_to_minutes(timespan.end)
+            else:
+                lower = to_minutes(timespan.start)
+                upper = to_minutes(timespan.end)
+            satisfied |= (lower <= starts) & (ends <= upper)
+        return satisfied.astype(np.float64)
 
 @dataclass()
 class RelativeTODPreference(Preferences):
@@ -234,9 +461,42 @@ class RelativeTODPreference(Preferences):
         if start < time(16, 0): return self.afternoon_shifts
         if start < time(20, 0): return self.evening_shifts
         return self.night_shifts
+    
+    def get_shift_preferences(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        start = starts % MINUTES_PER_DAY
+        return np.select(
+            [start < 8 * 60, start < 12 * 60, start < 16 * 60, start < 20 * 60],
+            [self.night_shifts, self.morning_shifts, self.afternoon_shifts, self.evening_shifts],
+            default=self.night_shifts
+        )
+
+class PredicatePreference(Preferences):
+    """
+    Returns 1 IFF a shift satisfies a predicate function.
+    The predicate must be a module-level function, as it is pickled by name.
+    """
+    
+    def __init__(self, predicate:callable):
+        self.predicate = predicate
+    
+    def get_shift_preference(self, shift: Timespan) -> float:
+        return float(self.predicate(shift))
+    
+    def __reduce__(self):
+        # Functions cannot be pickled or hashed by Streamlit's cache, so reduce to the predicate's name
+        return (PredicatePreference, (None,), {'module': self.predicate.__module__, 'name': self.predicate.__qualname__})
+    
+    def __setstate__(self, state):
+        self.predicate = getattr(import_module(state['module']), state['name'])
+    
+    def __eq__(self, other):
+        return isinstance(other, PredicatePreference) and self.predicate == other.predicate
+    
+    def __repr__(self):
+        return "PredicatePreference(%s)" % getattr(self.predicate, '__qualname__', repr(self.predicate))
 
 @dataclass()
-class MixinPreference():
+class MixinPreference(Preferences):
     """Executes code to determine shift preference."""
     mixin: str = ""
     
@@ -249,22 +509,39 @@ class MixinPreference():
         }
         
         # Wrap mixin in a function to allow use of return
-        self.mixin = f"def get_shift_preference(shift):\n{indent(self.mixin, '  ')}\npref_return_val = get_shift_preference(shift)"
+        # The function is compiled once here and then only called per shift
+        source = f"def get_shift_preference(shift):\n{indent(self.mixin, '  ')}\n"
+        try:
+            namespace = dict(self.local_context)
+            exec(compile(source, '<mixin>', 'exec'), namespace)
+            self.compiled_mixin = namespace['get_shift_preference']
+        except Exception as e:
+            warnings.warn(f"Error in preference mixin: {e}")
+            self.compiled_mixin = None
+        
+    def get_shift_preference(self, shift: Timespan) -> float:
+        if self.compiled_mixin == None:
+            return 0.0
         
-    def get_shift_preference(self, shift: Timespan) -> float:       
         try:
-            pref_return_val = 0.0
-            exec(self.mixin, self.local_context, {'shift': shift})
-            return float(pref_return_val)
+            return float(self.compiled_mixin(shift) or 0.0)
         except Exception as e:
             warnings.warn(f"Error in preference mixin: {e}")
             return 0.0
+    
+    def __getstate__(self):
+        # Compiled functions cannot be pickled; recompile from source instead
+        return {'mixin': self.mixin}
+    
+    def __setstate__(self, state):
+        self.mixin = state['mixin']
+        self.__post_init__()
 
 
 @dataclass()
 class Employee:
     positions: set[str]            = field(default_factory=set)
-    availability: set[Timespan]    = field(default_factory=set)
+    availability: Availability     = field(default_factory=Availability)
     preferences: list[Preferences] = field(default_factory=list)
     preferred_hours: float         = 0.0 # The number of hours the employee prefers to work in a week
     maximum_hours: float           = None # The maximum number of hours the this employee can work in a week
@@ -273,6 +550,7 @@ class Employee:
     deviation_weight: float        = 1.0 # A multiplier for how much the employee's deviation from preferred hours matters
     
     @staticmethod
+    @cache
     def get_default_preferences():
         return AveragePreference([
             LengthPreference(lambda x: 2.5*3600 <= x.total_seconds() <= 4*3600),
@@ -283,8 +561,10 @@ class Employee:
     def __post_init__(self):
         if not isinstance(self.positions, set):
             raise TypeError("Positions must be a set.")
-        if not isinstance(self.availability, set):
-            raise TypeError("Availability must be a set.")
+        if isinstance(self.availability, (set, frozenset, list)):
+            self.availability = Availability(self.availability)
+        if not isinstance(self.availability, Availability):
+            raise TypeError("Availability must be a set or Availability.")
         if not isinstance(self.preferences, list):
             raise TypeError("Preferences must be a list.")
         if self.tenure < 0:
@@ -294,7 +574,7 @@ class Employee:
         satisfaction = 0.0
         
         # If unavailable, return a very low satisfaction
-        is_available = any(shift in timespan for timespan in self.availability)
+        is_available = shift in self.availability
         if not is_available: satisfaction -= 10_000
             
         # Calculate satisfaction based on preferences
@@ -305,6 +585,26 @@ class Employee:
         
         return satisfaction
     
+    def get_shift_preferences(self, starts:np.ndarray, ends:np.ndarray) -> np.ndarray:
+        """
+        Vectorized get_shift_preference. Shifts are given as int64 arrays
+        of start and end minutes since MINUTE_EPOCH.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends   = np.asarray(ends, dtype=np.int64)
+        
+        # If unavailable, return a very low satisfaction
+        is_available = self.availability.contains_batch(starts, ends)
+        satisfaction = np.where(is_available, 0.0, -10_000.0)
+        
+        # Calculate satisfaction based on preferences
+        satisfaction += 5 * AveragePreference(self.preferences).get_shift_preferences(starts, ends)
+        
+        # Calculate satisfaction based on average preference
+        satisfaction += self.get_default_preferences().get_shift_preferences(starts, ends)
+        
+        return satisfaction
+    
     def satisfaction_details(self, shifts:list[Timespan]) -> tuple:
         """
         Calculates the deviation score (distance from preferred hours)
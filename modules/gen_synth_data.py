@@ -26,11 +26,13 @@ def generate_data(
         start_date: date = None,
         end_date: date = None,
         names: list[str] = names,
-        seed: int = None
+        seed: int = None,
+        positions: list[str] = positions
     ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Generates synthetic data for the scheduling problem.
     random.seed is based on the current day
+    Positions other than the Maker Desk are staffed like the Maker Rover.
     Returns 'availability_report', 'to_fill', 'preferences'
     """
     
@@ -107,7 +109,7 @@ def generate_data(
             if position == "The MILL Maker Desk":
                 start_time = time(8, 15).strftime("%I:%M %p")
                 end_time = time(23, 59).strftime("%I:%M %p")
-            elif position == "The MILL Maker Rover":
+            else:
                 start_time = time(11, 00).strftime("%I:%M %p")
                 end_time = time(23, 59).strftime("%I:%M %p")
             if datetime.strptime(date, "%B %d, %Y").weekday() >= 5:
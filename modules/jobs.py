@@ -0,0 +1,159 @@
+"""
+Runs schedule solves in the background, so the web app stays responsive while they run.
+
+Jobs are shared by every session of the app process and keyed by the fingerprint of their inputs,
+so the same schedule requested twice (e.g. by a rerun, or by two managers) is solved once.
+Live jobs stream every schedule the solver finds, so their best schedule so far can be read at any time,
+and cancelling one keeps it. Other jobs are solved with solver.create_schedule, as one model per group
+of positions that share no employees, and only finish with a schedule.
+Finished schedules are also stored on disk, so they survive restarts.
+"""
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+
+from modules.cache import DiskCache, fingerprint, source_fingerprint
+import modules.solver as solver
+
+@dataclass
+class SolveJob:
+    """A schedule being solved in the background. Its fields are updated by the worker as it runs."""
+    key: str
+    live: bool = False # whether schedules are streamed as they are found, and the search can be stopped
+    status: str = "queued" # queued, running, done, cancelled or failed
+    latest: solver.SolutionUpdate = None # the best schedule found so far
+    stats: solver.ScheduleStats = field(default_factory=solver.ScheduleStats)
+    error: str = None
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Future = field(default=None, repr=False)
+
+    @property
+    def schedule(self) -> list[tuple[str, str, solver.Timespan]] | None:
+        return None if self.latest == None else self.latest.schedule
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("done", "cancelled", "failed")
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds spent running, so far or in total."""
+        if self.started == None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def cancel(self):
+        """Stops the search. The best schedule found so far is kept. Jobs that are not live can only be stopped before they start."""
+        self.cancel_event.set()
+        if self.future != None and self.future.cancel():
+            self.finished = time.time()
+            self.status = "cancelled"
+
+class JobQueue:
+    """
+    Solves up to max_jobs schedules at once in background threads (CP-SAT releases the GIL while solving),
+    splitting the cores between them. Further jobs wait for a free slot.
+    The most recent max_kept finished jobs stay in memory for their results to be retrieved.
+    """
+
+    def __init__(self, max_jobs:int=None, max_kept:int=64, cache:DiskCache=None):
+        cores = os.cpu_count() or 1
+        self.max_jobs = max_jobs or max(1, cores // 4)
+        self.max_kept = max_kept
+        self.cache = cache or DiskCache()
+        self.num_workers = max(1, cores // self.max_jobs)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="solve")
+        self.jobs:dict[str, SolveJob] = dict()
+        self.lock = threading.Lock()
+        # Schedules stored by another version of the solver, scoring or parsing may differ, so it is part of every key
+        self.version = source_fingerprint(solver.__name__, *solver.SCHEDULE_DEPENDENCIES)
+
+    def key(self, to_schedule, employees, **options) -> str:
+        return fingerprint(self.version, to_schedule, employees, options)
+
+    def submit(self, to_schedule, employees, live=False, **options) -> SolveJob:
+        """
+        Starts solving a schedule, and returns its job. Live jobs use solver.stream_schedule, others solver.create_schedule.
+        If the same inputs are already being solved or were solved before, that job is returned instead.
+        A previous_schedule only changes where the search starts, so a job for the same inputs started
+        from any (or no) previous schedule is returned too. Cancelled and failed jobs are started again.
+        """
+        key = self.key(to_schedule, employees, **options)
+        inputs_key = self.key(to_schedule, employees, **{**options, 'previous_schedule': None})
+        with self.lock:
+            for existing_key in dict.fromkeys((key, inputs_key)):
+                job = self._existing(existing_key)
+                if job != None:
+                    return job
+
+            job = SolveJob(key, live=live)
+            job.future = self.executor.submit(self._run, job, to_schedule, employees, options, inputs_key)
+            self.jobs[key] = self.jobs[inputs_key] = job
+            self._forget_finished()
+            return job
+
+    def get(self, key:str) -> SolveJob | None:
+        with self.lock:
+            return self.jobs.get(key)
+
+    def _existing(self, key:str) -> SolveJob | None:
+        """The running or finished job stored under key, from memory or the disk cache."""
+        job = self.jobs.get(key)
+        if job != None and job.status not in ("cancelled", "failed"):
+            return job
+        
+        cached = self.cache.get(key)
+        if cached == None:
+            return None
+        job = SolveJob(key, status="done")
+        job.latest, job.stats = cached
+        job.started = job.finished = job.submitted
+        self.jobs[key] = job
+        return job
+
+    def _forget_finished(self):
+        finished = sorted((job.finished, key) for key, job in self.jobs.items() if job.is_finished)
+        for _, key in finished[:max(0, len(finished) - self.max_kept)]:
+            del self.jobs[key]
+
+    def _run(self, job:SolveJob, to_schedule, employees, options, inputs_key):
+        job.status, job.started = "running", time.time()
+        try:
+            if job.live:
+                for update in solver.stream_schedule(to_schedule, employees, num_workers=self.num_workers, cancel=job.cancel_event, stats=job.stats, **options):
+                    job.latest = update
+            else:
+                schedule, job.stats = solver.create_schedule(to_schedule, employees, return_stats=True, num_workers=self.num_workers, **options)
+                if schedule != None:
+                    job.latest = solver.SolutionUpdate(schedule, job.stats.objective, job.stats.best_bound, time.time() - job.started)
+        except Exception:
+            job.error = traceback.format_exc()
+            status = "failed"
+        else:
+            status = "cancelled" if job.live and job.cancel_event.is_set() else "done"
+            # Only complete searches are stored, and failed ones are retried next time
+            if status == "done" and job.latest != None:
+                for key in dict.fromkeys((job.key, inputs_key)):
+                    self.cache.set(key, (job.latest, job.stats))
+        
+        # A job is finished once its status says so, so finished must already be set by then
+        job.finished = time.time()
+        job.status = status
+
+# Shared by every session of the app
+_queue:JobQueue = None
+_queue_lock = threading.Lock()
+
+def job_queue() -> JobQueue:
+    """The process-wide JobQueue, created on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue == None:
+            _queue = JobQueue()
+        return _queue
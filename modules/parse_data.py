@@ -1,51 +1,136 @@
-from modules.dtypes import Timespan, Employee, AveragePreference, RelativeTODPreference, SpecificTODPreference, MixinPreference, MaxPreference
-from dateparser import parse
+from modules.dtypes import Timespan, Employee, AveragePreference, RelativeTODPreference, SpecificTODPreference, MixinPreference, MaxPreference, PredicatePreference, Availability, to_minutes, time_to_minutes
 from datetime import datetime, time, timedelta, date
-import pandas as pd
+from functools import lru_cache
+import re
+import numpy as np
+from typing import TYPE_CHECKING
+
+# pandas and dateparser (with its locale data) are slow to import, so they are imported where used
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Tags are pre-defined preferences, evaluated as native predicates on a shift
+# Predicates are named module-level functions so that employees remain picklable
+def _tag_morning(shift):   return shift.end.time() < time(12, 0)
+def _tag_afternoon(shift): return shift.start.time() >= time(12, 0) and shift.end.time() <= time(18, 0)
+def _tag_evening(shift):   return shift.start.time() >= time(17, 0) and shift.end.time() <= time(21, 0)
+def _tag_night(shift):     return shift.start.time() >= time(20, 0) or shift.end.time() <= time(6, 0)
+
+def _tag_closing(shift):   return shift.end.time() >= time(20, 0)
+def _tag_noclosing(shift): return shift.end.time() < time(20, 0)
+
+def _tag_opening(shift):   return shift.start.time() < time(9, 0)
+def _tag_noopening(shift): return shift.start.time() >= time(9, 00)
+
+def _tag_weekend(shift):   return shift.start.weekday() >= 5
+def _tag_noweekend(shift): return shift.start.weekday() < 5
+
+def _tag_sunday(shift):    return shift.start.weekday() == 6
+def _tag_monday(shift):    return shift.start.weekday() == 0
+def _tag_tuesday(shift):   return shift.start.weekday() == 1
+def _tag_wednesday(shift): return shift.start.weekday() == 2
+def _tag_thursday(shift):  return shift.start.weekday() == 3
+def _tag_friday(shift):    return shift.start.weekday() == 4
 
 TAG_DEFINITIONS = {
-    'morning': 'return shift.end.time() < time(12, 0)',
-    'afternoon': 'return shift.start.time() >= time(12, 0) and shift.end.time() <= time(18, 0)',
-    'evening': 'return shift.start.time() >= time(17, 0) and shift.end.time() <= time(21, 0)',
-    'night': 'return shift.start.time() >= time(20, 0) or shift.end.time() <= time(6, 0)',
-    
-    'closing': 'return shift.end.time() >= time(20, 0)',
-    'noclosing': 'return shift.end.time() < time(20, 0)',
-    
-    'opening': 'return shift.start.time() < time(9, 0)',
-    'noopening': 'return shift.start.time() >= time(9, 00)',
-    
-    'weekend': 'return shift.start.weekday() >= 5',
-    'noweekend': 'return shift.start.weekday() < 5',
-    
-    'sunday': 'return shift.start.weekday() == 6',
-    'monday': 'return shift.start.weekday() == 0',
-    'tuesday': 'return shift.start.weekday() == 1',
-    'wednesday': 'return shift.start.weekday() == 2',
-    'thursday': 'return shift.start.weekday() == 3',
-    'friday': 'return shift.start.weekday() == 4',
+    'morning':   _tag_morning,
+    'afternoon': _tag_afternoon,
+    'evening':   _tag_evening,
+    'night':     _tag_night,
+    
+    'closing':   _tag_closing,
+    'noclosing': _tag_noclosing,
+    
+    'opening':   _tag_opening,
+    'noopening': _tag_noopening,
+    
+    'weekend':   _tag_weekend,
+    'noweekend': _tag_noweekend,
+    
+    'sunday':    _tag_sunday,
+    'monday':    _tag_monday,
+    'tuesday':   _tag_tuesday,
+    'wednesday': _tag_wednesday,
+    'thursday':  _tag_thursday,
+    'friday':    _tag_friday,
 }
-def parse_cell(day:date, cell:str) -> list[Timespan]:
+
+# The formats times are written in by Humanity and this app, e.g. "08:00 AM", "8am", "11:59 PM" and "14:30"
+TIME_PATTERN = re.compile(r"(\d{1,2})(?:[:.](\d{2}))?\s*(?:([ap])\.?\s*m?\.?)?", re.IGNORECASE)
+
+@lru_cache(maxsize=4096)
+def parse_time(text:str) -> time:
+    """
+    Parses a time of day. Common formats are parsed directly,
+    anything else falls back to dateparser, which is far slower.
+    """
+    word = text.strip().casefold()
+    if word == "noon":     return time(12, 0)
+    if word == "midnight": return time(0, 0)
+    
+    match = TIME_PATTERN.fullmatch(text.strip())
+    if match != None and (match[2] != None or match[3] != None):
+        hour, minute = int(match[1]), int(match[2] or 0)
+        if match[3] != None and 1 <= hour <= 12 and minute < 60:
+            return time(hour % 12 + (12 if match[3].casefold() == "p" else 0), minute)
+        if match[3] == None and hour < 24 and minute < 60:
+            return time(hour, minute)
+    
+    from dateparser import parse
+    parsed = parse(text)
+    if parsed == None:
+        raise ValueError(f"Could not parse the time {text!r}")
+    return parsed.time()
+
+@lru_cache(maxsize=4096)
+def parse_cell_times(cell:str) -> tuple[tuple[time, time], ...]:
+    """Parses a comma-separated list of time ranges into (start, end) times of day."""
     if cell.casefold() == "all day":
-        return [Timespan(datetime.combine(day, time.min), datetime.combine(day, time.max))]
+        return ((time.min, time.max),)
     
-    timespans = list()
+    times = list()
     timespan_strs = cell.split(",")
     for timespan_str in timespan_strs:
         if '-' not in timespan_str:
             continue
         
         start_str, end_str = timespan_str.split("-")
-        if end_str.strip().casefold() in ("midnight", "12am", "12:00am"):
-            end_str = "11:59pm"
-        start, end = parse(start_str), parse(end_str)
-        timespans.append(Timespan(datetime.combine(day, start.time()), datetime.combine(day, end.time())))
-    return timespans
+        start, end = parse_time(start_str), parse_time(end_str)
+        # Ranges ending at midnight end at the last minute of the day
+        if end == time(0, 0):
+            end = time(23, 59)
+        times.append((start, end))
+    return tuple(times)
+
+@lru_cache(maxsize=4096)
+def parse_cell_minutes(cell:str) -> tuple[tuple[int, int], ...]:
+    """Parses a comma-separated list of time ranges into (start, end) minutes since midnight."""
+    return tuple((time_to_minutes(start), time_to_minutes(end)) for start, end in parse_cell_times(cell))
 
-def parse_employees(raw_employee_data:pd.DataFrame) -> dict[str, Employee]:
+@lru_cache(maxsize=4096)
+def parse_time_spans(cell:str) -> tuple[Timespan, ...]:
+    """Parses a comma-separated list of time ranges into time of day Timespans, which are immutable and so shared."""
+    return tuple(Timespan(start, end) for start, end in parse_cell_times(cell))
+
+def parse_cell(day:date, cell:str) -> list[Timespan]:
+    return [Timespan(datetime.combine(day, start), datetime.combine(day, end)) for start, end in parse_cell_times(cell)]
+
+@lru_cache(maxsize=4096)
+def parse_date(text:str) -> date:
+    """Parses a date as written in Humanity reports, e.g. "January 24, 2025" or "Jan 24, 2025"."""
+    for date_format in ("%B %d, %Y", "%b %d, %Y"):
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Could not parse the date {text!r}")
+
+def parse_employees(raw_employee_data:'pd.DataFrame') -> dict[str, Employee]:
+    # Missing cells become None, converted for the whole table at once instead of row by row
+    rows = raw_employee_data.astype(object).where(raw_employee_data.notna(), None).to_dict("records")
+    
     employees = {}
-    for _, row in raw_employee_data.iterrows():
-        row = row.where(pd.notna(row), None)
+    for row in rows:
         name = row["Employee"]
         tenure = row["Tenure"]
         preferred_hours = row["Preferred Hours"]
@@ -58,9 +143,8 @@ def parse_employees(raw_employee_data:pd.DataFrame) -> dict[str, Employee]:
         
         # Favored Hours Preferences
         preferences = AveragePreference()
-        if 'Favored Hours' in row:
-            favored_hours = parse_cell(datetime.now().date(), row["Favored Hours"])
-            favored_hours = [x.strip_date() for x in favored_hours if x != None]
+        if row.get('Favored Hours') != None:
+            favored_hours = list(parse_time_spans(row["Favored Hours"]))
             preferences.append(SpecificTODPreference(favored_hours))
 
         # Relative Time of Day Preferences (Morning, Afternoon, Evening)
@@ -72,7 +156,7 @@ def parse_employees(raw_employee_data:pd.DataFrame) -> dict[str, Employee]:
             preferences.append(RelativeTODPreference(morning_preferences, afternoon_shifts, evening_shifts, night_shifts))
         
         # Shift mixins
-        if 'Mixins' in row:
+        if 'Mixins' in row and row['Mixins'] != None:
             preferences.append(MixinPreference(row["Mixins"]))
         
         # Tags are pre-defined mixins
@@ -80,7 +164,7 @@ def parse_employees(raw_employee_data:pd.DataFrame) -> dict[str, Employee]:
             tag_preferences = list()
             for tag in row.get('Tags', '').split(','):
                 tag = tag.strip().casefold()
-                if tag in TAG_DEFINITIONS: tag_preferences.append(MixinPreference(TAG_DEFINITIONS[tag]))
+                if tag in TAG_DEFINITIONS: tag_preferences.append(PredicatePreference(TAG_DEFINITIONS[tag]))
             if tag_preferences:
                 preferences.append(MaxPreference(tag_preferences), 7)       
             
@@ -88,44 +172,70 @@ def parse_employees(raw_employee_data:pd.DataFrame) -> dict[str, Employee]:
         employees[name] = Employee(tenure=tenure, preferences=preferences, preferred_hours=preferred_hours, maximum_hours=max_hours)
     return employees
 
-def parse_availability(raw_availability_data:pd.DataFrame, employees: dict[str, Employee]):
-    for _, row in raw_availability_data.iterrows():
-        name = row["Employee"]
-        if name not in employees:
+def parse_availability(raw_availability_data:'pd.DataFrame', employees: dict[str, Employee]):
+    # Columns that are dates hold availability, their headers are parsed once
+    days:dict[str, date] = dict()
+    for column in raw_availability_data.columns:
+        try:
+            days[column] = parse_date(column)
+        except (ValueError, TypeError):
             continue
-        
-        availability = set()
-        for column in raw_availability_data.columns:
-            # If the column is a date, parse. Otherwise skip
-            day = None
-            
-            try:
-                day = datetime.strptime(column, "%B %d, %Y").date()
-            except ValueError:
-                pass
-            
-            try:
-                day = datetime.strptime(column, "%b %d, %Y").date()
-            except ValueError:
-                pass
-            
-            if pd.isna(row[column]) or day == None:
-                continue
-            
-            availability = availability.union(parse_cell(day, row[column]))
-        employees[name].availability = availability
-        employees[name].positions = set(map(str.strip, row["Positions"].split(",")))
+    
+    # Later rows for the same employee replace earlier ones
+    rows = raw_availability_data[raw_availability_data["Employee"].isin(employees.keys())]
+    rows = rows.drop_duplicates("Employee", keep="last")
+    
+    # One row per time range, with every distinct cell parsed once
+    cells = rows.melt(id_vars="Employee", value_vars=list(days), var_name="Day", value_name="Cell").dropna(subset=["Cell"])
+    cells = cells.assign(Range=cells["Cell"].map(parse_cell_minutes)).explode("Range").dropna(subset=["Range"])
+    
+    day_minutes = cells["Day"].map({column: to_minutes(datetime.combine(day, time())) for column, day in days.items()})
+    ranges = np.array(cells["Range"].tolist(), dtype=np.int64).reshape(-1, 2)
+    starts = day_minutes.to_numpy(dtype=np.int64) + ranges[:, 0]
+    ends   = day_minutes.to_numpy(dtype=np.int64) + ranges[:, 1]
+    
+    by_employee = cells.groupby("Employee", sort=False).indices
+    no_ranges = np.empty(0, dtype=np.intp)
+    for name, positions in zip(rows["Employee"], rows["Positions"]):
+        indices = by_employee.get(name, no_ranges)
+        employees[name].availability = Availability.from_minutes(starts[indices], ends[indices])
+        employees[name].positions = set(map(str.strip, positions.split(",")))
 
-def parse_to_fill(raw_to_fill_data:pd.DataFrame) -> list[tuple[str, Timespan]]:
+def parse_to_fill(raw_to_fill_data:'pd.DataFrame') -> list[tuple[str, Timespan]]:
     to_fill = []
-    for _, row in raw_to_fill_data.iterrows():
-        position = row["Position"]
-        day = datetime.strptime(row["Date"], "%B %d, %Y").date()
-        timespans = parse_cell(day, row["Hours"])
+    for position, day, hours in zip(raw_to_fill_data["Position"], raw_to_fill_data["Date"], raw_to_fill_data["Hours"]):
+        timespans = parse_cell(parse_date(day), hours)
         to_fill.extend((position, timespan) for timespan in timespans)
     return to_fill
 
+def export_schedule(schedule:list[tuple[str, str, Timespan]]) -> 'pd.DataFrame':
+    """Formats a schedule as a CSV that can be imported into Humanity's schedule tab."""
+    import pandas as pd
+    return pd.DataFrame(
+        [
+            (
+                "",
+                name,
+                "",
+                position,
+                timespan.start.date().isoformat(),
+                timespan.end.date().isoformat(),
+                timespan.start.strftime("%I:%M %p"),
+                timespan.end.strftime("%I:%M %p"),
+                "",
+                "",
+                "",
+                "",
+                ""
+            )
+            for name, position, timespan in schedule
+        ],
+        columns=["eid", "name", "location", "position", "start date", "end date", "start time", "end time", "notes", "title", "open slots", "remote site", "shift tags"]
+    )
+
 if __name__ == "__main__":
+    import pandas as pd
+    
     employees = parse_employees(pd.read_csv("preferences.csv"))
     parse_availability(pd.read_csv("availability_report.csv"), employees)
     to_fill = parse_to_fill(pd.read_csv("to_fill.csv"))
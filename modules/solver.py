@@ -1,11 +1,23 @@
-from ortools.sat.python import cp_model
-from dataclasses import dataclass
-from modules.dtypes import Timespan, Employee
+from dataclasses import dataclass, field, replace
+from modules.dtypes import Timespan, MinuteSpan, Employee, to_minutes, time_to_minutes, MINUTE_EPOCH, MINUTES_PER_DAY
 from datetime import timedelta, time, datetime, date
 import warnings
-from streamlit import cache_data
+from modules.cache import persistent_cache
 import decimal
 from collections import defaultdict
+from bisect import bisect_left, bisect_right
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+import os
+import queue
+import threading
+import numpy as np
+from functools import cache
+from typing import TYPE_CHECKING, Iterator
+
+# ortools takes a while to load, and is only needed once a model is built (not e.g. for cached schedules)
+if TYPE_CHECKING:
+    from ortools.sat.python import cp_model
 
 def drange(x, y, jump):
     x = decimal.Decimal(x)
@@ -24,130 +36,782 @@ def rfrac(x:float, frac:float):
         frac = 1 / frac
     return round(x * frac) / frac
 
-@cache_data
-def create_schedule(
-        to_schedule: list[tuple[str, Timespan]],
-        employees: dict[str, Employee],
-        solver_max_time=10,
-        solver_seed=0,
-        max_hours_per_week=18,
-        shift_lengths=[3, 4],
-        min_one_shift_per_employee=False,
-        absolute_shift_minimum_length=2.5,
-        max_shifts_per_day=1,
-        shift_granularity=1,
-        consistent_shift_weight=1.5
-    ) -> list[tuple[str, str, Timespan]] | None:
+def segment_cover(timespan:MinuteSpan, shifts:list[tuple[MinuteSpan, object]]) -> list[tuple[MinuteSpan, list]]:
     """
-    May take a while to run if there are many possible shifts.
-    Returns a list of tuples containing the employee name, position scheduled, and shift timespan.
+    Splits a timespan into elementary segments at every shift boundary inside it.
+    Returns each segment along with the items of all shifts covering that segment.
+    Each shift is only visited for the segments it actually covers.
     """
+    boundaries = {timespan.start, timespan.end}
+    for shift, _ in shifts:
+        boundaries.add(min(max(shift.start, timespan.start), timespan.end))
+        boundaries.add(min(max(shift.end, timespan.start), timespan.end))
+    boundaries = sorted(boundaries)
     
-    model = cp_model.CpModel()
+    segments = [list() for _ in range(len(boundaries) - 1)]
+    for shift, item in shifts:
+        first = bisect_right(boundaries, shift.start) - 1
+        last = bisect_left(boundaries, shift.end)
+        for i in range(max(first, 0), min(last, len(segments))):
+            segments[i].append(item)
+    return [(type(timespan)(boundaries[i], boundaries[i + 1]), items) for i, items in enumerate(segments)]
+
+def overlap_cliques(shifts:list[tuple[MinuteSpan, object]]) -> list[list]:
+    """
+    Sweeps over a list of shifts in time order and returns the items of every
+    maximal group of mutually overlapping shifts, skipping groups of one.
+    Shifts that only touch at their endpoints do not overlap.
+    """
+    # At equal times, ends (0) are processed before starts (1)
+    events = sorted(
+        [(shift.start, 1, i) for i, (shift, _) in enumerate(shifts)] +
+        [(shift.end,   0, i) for i, (shift, _) in enumerate(shifts)],
+        key=lambda event: (event[0], event[1])
+    )
+    
+    cliques = list()
+    active = dict()
+    grew = False
+    for _, is_start, i in events:
+        if is_start:
+            active[i] = shifts[i][1]
+            grew = True
+            continue
+        
+        # The active set is maximal right before its first shift ends
+        if grew and len(active) > 1:
+            cliques.append(list(active.values()))
+        grew = False
+        del active[i]
+    return cliques
+
+ShiftKey = tuple[str, int, MinuteSpan] # (employee name, position id, shift)
+
+@dataclass
+class ShiftIndex:
+    """
+    Groups the keys of all shift variables in a single pass,
+    so constraint blocks only visit the variables they constrain.
+    """
+    by_employee:      dict[str, list[ShiftKey]]                        = field(default_factory=lambda: defaultdict(list))
+    by_position:      dict[int, list[ShiftKey]]                        = field(default_factory=lambda: defaultdict(list))
+    by_employee_day:  dict[tuple[str, int], list[ShiftKey]]            = field(default_factory=lambda: defaultdict(list))
+    by_employee_week: dict[tuple[str, tuple[int, int]], list[ShiftKey]] = field(default_factory=lambda: defaultdict(list))
+    by_employee_slot: dict[tuple[str, int, int, int], list[ShiftKey]]  = field(default_factory=lambda: defaultdict(list))
+    
+    @staticmethod
+    def build(keys) -> 'ShiftIndex':
+        index = ShiftIndex()
+        for key in keys:
+            emp_name, pid, shift = key
+            day = shift.day
+            index.by_employee[emp_name].append(key)
+            index.by_position[pid].append(key)
+            index.by_employee_day[(emp_name, day)].append(key)
+            index.by_employee_week[(emp_name, week_of_day(day))].append(key)
+            index.by_employee_slot[(emp_name, *slot_of(shift))].append(key)
+        return index
+
+def week_of(day:date) -> tuple[int, int]:
+    """Returns the (ISO year, ISO week) a day falls in."""
+    iso = day.isocalendar()
+    return (iso.year, iso.week)
+
+@cache
+def week_of_day(day:int) -> tuple[int, int]:
+    """Returns the (ISO year, ISO week) of a day given in days since MINUTE_EPOCH."""
+    return week_of(MINUTE_EPOCH.date() + timedelta(days=day))
+
+def slot_of(shift:MinuteSpan) -> tuple[int, int, int]:
+    """Returns the (weekday, start hour, start minute) of a shift."""
+    start = shift.start % MINUTES_PER_DAY
+    return (shift.day % 7, start // 60, start % 60)
+
+@dataclass
+class ScheduleModel:
+    """A built CP-SAT model along with the variables needed to read a schedule back out of it."""
+    model: 'cp_model.CpModel'
+    shift_vars: dict[ShiftKey, 'cp_model.IntVar']
+    index: ShiftIndex
+    to_schedule: list[tuple[str, Timespan]]
+    uncovered: list[tuple[str, Timespan]] = field(default_factory=list) # (position, window) no employee can cover
+    hint_complete: bool = False # whether the hint covers every variable, see complete_hint
+    
+    def extract_schedule(self, solver:'cp_model.CpSolver') -> list[tuple[str, str, Timespan]]:
+        schedule = list()
+        for (emp_name, pid, shift), var in self.shift_vars.items():
+            if solver.Value(var) == 0: continue
+            schedule.append((emp_name, self.to_schedule[pid][0], shift.to_timespan()))
+        return schedule
+    
+    def hint_schedule(self, schedule:list[tuple[str, str, Timespan]]):
+        """Replaces the model's hint with a schedule, see build_model's previous_schedule."""
+        self.model.ClearHints()
+        self.hint_complete = False
+        _add_schedule_hint(self.model, self.shift_vars, self.to_schedule, schedule)
+
+def _add_schedule_hint(model:'cp_model.CpModel', shift_vars:dict[ShiftKey, 'cp_model.IntVar'], to_schedule, schedule):
+    """Hints the shifts of a schedule as assigned and every other shift as unassigned."""
+    assigned = set((emp_name, position.strip(), MinuteSpan.from_timespan(shift)) for emp_name, position, shift in schedule)
+    for (emp_name, pid, shift), var in shift_vars.items():
+        model.AddHint(var, int((emp_name, to_schedule[pid][0].strip(), shift) in assigned))
+
+@dataclass
+class FeasibilityReport:
+    """
+    Reasons a schedule provably cannot be filled, found by check_feasibility without solving.
+    An empty report does not prove a schedule exists.
+    """
+    # (position, window) no qualified employee can work
+    uncovered:   list[tuple[str, Timespan]] = field(default_factory=list)
+    # (positions, window, employees needed, employees able to work them) where positions are open at once
+    understaffed: list[tuple[list[str], Timespan, int, int]] = field(default_factory=list)
+    # (ISO year and week, positions, hours needed, hours the qualified employees can work)
+    weekly_shortfalls: list[tuple[tuple[int, int], list[str], float, float]] = field(default_factory=list)
+    
+    @property
+    def feasible(self) -> bool:
+        return len(self.uncovered) == 0 and len(self.understaffed) == 0 and len(self.weekly_shortfalls) == 0
     
-    # Create a list of all possible shifts on each position
-    all_shifts:list[tuple[tuple[int, str], Timespan]] = []
+    def extend(self, other:'FeasibilityReport'):
+        """Adds the findings of a separately checked part of the same schedule."""
+        self.uncovered.extend(other.uncovered)
+        self.understaffed.extend(other.understaffed)
+        self.weekly_shortfalls.extend(other.weekly_shortfalls)
+    
+    def __str__(self):
+        lines = []
+        for position, window in self.uncovered:
+            lines.append(f"No employee can work {position} from {window.start:%a %b %d %H:%M} to {window.end:%H:%M}")
+        for positions, window, needed, able in self.understaffed:
+            lines.append(f"{needed} employees are needed for {', '.join(positions)} from {window.start:%a %b %d %H:%M} to {window.end:%H:%M}, but only {able} can work them")
+        for (year, week), positions, needed, able in self.weekly_shortfalls:
+            lines.append(f"{', '.join(positions)}: {needed:.1f} hours to fill in week {week} of {year}, but the employees can only work {able:.1f}")
+        return "\n".join(lines) or "No problems found"
+
+def relative_gap(objective:float | None, best_bound:float | None) -> float | None:
+    """The relative gap between an objective and its best bound, 0 once a schedule is optimal."""
+    if objective == None or best_bound == None:
+        return None
+    return abs(objective - best_bound) / max(1.0, abs(objective))
+
+@dataclass
+class ScheduleStats:
+    """
+    Opt-in instrumentation of create_schedule.
+    Phase times are summed over every model built (e.g. hard then soft availability);
+    variable and constraint counts describe the last model built, per constraint family.
+    """
+    phase_times:       dict[str, float] = field(default_factory=dict) # phase -> wall seconds
+    variable_counts:   dict[str, int]   = field(default_factory=dict) # phase -> variables added
+    constraint_counts: dict[str, int]   = field(default_factory=dict) # phase -> constraints added
+    hard_availability: bool  = None
+    status:            str   = None
+    objective:         float = None
+    best_bound:        float = None
+    conflicts:         int   = 0
+    branches:          int   = 0
+    feasibility: FeasibilityReport = None # the last check_feasibility, which skips solving if it finds problems
+    # (seconds into the search, objective or None, best bound) whenever a solution or bound improves
+    progress: list[tuple[float, float | None, float]] = field(default_factory=list)
+    
+    def phase_marker(self, model:'cp_model.CpModel'):
+        """
+        Returns a function to call at the end of each build phase,
+        which records the time and model growth since the previous call.
+        """
+        self.variable_counts.clear()
+        self.constraint_counts.clear()
+        last = [perf_counter(), 0, 0]
+        
+        def mark(phase:str):
+            proto = model.Proto()
+            now, variables, constraints = perf_counter(), len(proto.variables), len(proto.constraints)
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + now - last[0]
+            self.variable_counts[phase] = self.variable_counts.get(phase, 0) + variables - last[1]
+            self.constraint_counts[phase] = self.constraint_counts.get(phase, 0) + constraints - last[2]
+            last[:] = perf_counter(), variables, constraints
+        return mark
+    
+    def merge(self, other:'ScheduleStats'):
+        """Adds the statistics of a separately solved part of the same schedule."""
+        for phase, seconds in other.phase_times.items():
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + seconds
+        for phase, count in other.variable_counts.items():
+            self.variable_counts[phase] = self.variable_counts.get(phase, 0) + count
+        for phase, count in other.constraint_counts.items():
+            self.constraint_counts[phase] = self.constraint_counts.get(phase, 0) + count
+        
+        self.hard_availability = other.hard_availability if self.hard_availability == None else self.hard_availability and other.hard_availability
+        if self.status == None:
+            self.objective, self.best_bound = other.objective, other.best_bound
+        else:
+            self.objective = None if None in (self.objective, other.objective) else self.objective + other.objective
+            self.best_bound = None if None in (self.best_bound, other.best_bound) else self.best_bound + other.best_bound
+        self.status = other.status if self.status in (None, "OPTIMAL") else self.status
+        self.conflicts += other.conflicts
+        self.branches += other.branches
+        if other.feasibility != None:
+            if self.feasibility == None: self.feasibility = FeasibilityReport()
+            self.feasibility.extend(other.feasibility)
+        
+        # Progress of separate searches cannot be added up over time
+        self.progress.clear()
+    
+    @property
+    def gap(self) -> float | None:
+        return relative_gap(self.objective, self.best_bound)
+
+@dataclass
+class SolutionUpdate:
+    """An improving schedule found while solving, see stream_schedule."""
+    schedule:   list[tuple[str, str, Timespan]]
+    objective:  float | None # None for a greedy schedule, which the solver has not scored
+    best_bound: float | None
+    seconds:    float        # seconds into the search
+    
+    @property
+    def gap(self) -> float | None:
+        return relative_gap(self.objective, self.best_bound)
+
+@cache
+def _solution_streamer_type() -> type:
+    """The solution callback class, defined on first use as it subclasses an ortools class."""
+    from ortools.sat.python import cp_model
+    
+    class _SolutionStreamer(cp_model.CpSolverSolutionCallback):
+        """
+        Records the objective and bound of every improving solution into a ScheduleStats,
+        and with on_solution, also reads its schedule out of the solver and passes it on as a SolutionUpdate.
+        """
+        
+        def __init__(self, schedule_model:'ScheduleModel', stats:'ScheduleStats'=None, on_solution:callable=None):
+            super().__init__()
+            self.schedule_model = schedule_model
+            self.stats = stats
+            self.on_solution = on_solution
+        
+        def on_solution_callback(self):
+            objective, best_bound, seconds = self.ObjectiveValue(), self.BestObjectiveBound(), self.WallTime()
+            if self.stats != None:
+                self.stats.objective, self.stats.best_bound = objective, best_bound
+                self.stats.progress.append((seconds, objective, best_bound))
+            if self.on_solution != None:
+                self.on_solution(SolutionUpdate(self.schedule_model.extract_schedule(self), objective, best_bound, seconds))
+    return _SolutionStreamer
+
+def generate_shifts(
+        to_schedule: list[tuple[str, Timespan]],
+        shift_lengths=[3, 4],
+        absolute_shift_minimum_length=2.5,
+    ) -> list[tuple[tuple[int, str], MinuteSpan]]:
+    """Creates a list of all possible shifts on each position, as MinuteSpans."""
+    
+    all_shifts:list[tuple[tuple[int, str], MinuteSpan]] = []
     for pid, (position, timespan) in enumerate(to_schedule):
-        timespan_time = timespan.strip_date()
+        # Times of day in minutes since midnight, offset by the window's start and end days
+        window_start, window_end = time_to_minutes(timespan.start.time()), time_to_minutes(timespan.end.time())
+        start_day = to_minutes(timespan.start) - window_start
+        end_day   = to_minutes(timespan.end) - window_end
         # drange(rfrac(tfloat(timespan_time.start), shift_granularity), rfrac(tfloat(timespan_time.end), shift_granularity), shift_granularity):
-        for possible_start in range(timespan_time.start.hour, timespan_time.end.hour):
+        for possible_start in range(window_start // 60, window_end // 60):
             for length in shift_lengths:
-                start_time = time(possible_start)
-                
-                if start_time < timespan_time.start: start_time = timespan_time.start
-                if possible_start + length > 23:     end_time = time(23, 59)
-                else:                                end_time = time(possible_start + length)
-                if end_time   > timespan_time.end:   end_time = timespan_time.end
-                
-                start = datetime.combine(timespan.start.date(), start_time)
-                end   = datetime.combine(timespan.end.date(), end_time)
-                shift = Timespan(start, end)
+                start_time = max(possible_start * 60, window_start)
+                if possible_start + length > 23: end_time = 23 * 60 + 59
+                else:                            end_time = (possible_start + length) * 60
+                end_time = min(end_time, window_end)
                 
                 # Constraints: No shifts shorter than the minimum time
                 # This occurs when the shift is at the end of the day
-                if shift.length.total_seconds() < absolute_shift_minimum_length * 3600:
+                shift_length = end_day + end_time - start_day - start_time
+                if shift_length < absolute_shift_minimum_length * 60:
                     continue
-                if shift.length.total_seconds() > max(shift_lengths) * 3600:
+                if shift_length > max(shift_lengths) * 60:
                     continue
                 
                 # Append shift to list of all shifts
-                if shift.strip_date() in timespan_time:
-                    all_shifts.append(((pid, position), shift))
+                all_shifts.append(((pid, position), MinuteSpan(start_day + start_time, end_day + end_time)))
+    return all_shifts
+
+def _blocked_by_fixed(fixed_shifts:list[MinuteSpan], starts:np.ndarray, ends:np.ndarray, max_shifts_per_day=1) -> np.ndarray:
+    """
+    Marks the candidate shifts (given in minutes) an employee cannot take
+    because of the shifts they are already fixed to work.
+    """
+    days = starts // MINUTES_PER_DAY
+    start_hours = (starts % MINUTES_PER_DAY) // 60
+    end_hours = (ends % MINUTES_PER_DAY) // 60
+    
+    blocked = np.zeros(len(starts), dtype=bool)
+    fixed_days = []
+    for shift in fixed_shifts:
+        fixed_day = shift.day
+        fixed_days.append(fixed_day)
+        
+        # Constraints: No overlapping shifts, and no closing then opening the next day
+        blocked |= (starts < shift.end) & (ends > shift.start)
+        if (shift.end % MINUTES_PER_DAY) // 60 >= 20:
+            blocked |= (days == fixed_day + 1) & (start_hours <= 10)
+        if (shift.start % MINUTES_PER_DAY) // 60 <= 10:
+            blocked |= (days == fixed_day - 1) & (end_hours >= 20)
+    
+    # Constraints: Days already at the daily shift limit
+    fixed_days, counts = np.unique(fixed_days, return_counts=True)
+    blocked |= np.isin(days, fixed_days[counts >= max_shifts_per_day])
+    return blocked
+
+def greedy_schedule(
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        max_hours_per_week=18,
+        shift_lengths=[3, 4],
+        absolute_shift_minimum_length=2.5,
+        max_shifts_per_day=1,
+        consistent_shift_weight=1.5,
+        hard_availability=True,
+        fixed_schedule:list[tuple[str, str, Timespan]]=None,
+        max_backtracks=10_000,
+        stats:ScheduleStats=None
+    ) -> list[tuple[str, str, Timespan]] | None:
+    """
+    Builds a schedule without CP-SAT, in milliseconds, by filling each position's timeline
+    from start to end with the best scoring candidate shift and employee that still fits.
+    Scores follow build_model's objective: shift preferences, the change in deviation
+    from preferred hours, and repeating a slot already worked.
+
+    If that runs out of employees, the timelines are filled again preferring longer shifts
+    and the employees with the most hours left, which uses up as few employees as possible.
     
+    Every hard constraint of build_model holds, except min_one_shift_per_employee which is not enforced.
+    Returns None if some timeline still cannot be filled within max_backtracks attempts per pass.
+    """
+    greedy_start = perf_counter()
+    all_shifts = generate_shifts(to_schedule, shift_lengths, absolute_shift_minimum_length)
+    all_starts = np.fromiter((shift.start for _, shift in all_shifts), dtype=np.int64, count=len(all_shifts))
+    all_ends   = np.fromiter((shift.end   for _, shift in all_shifts), dtype=np.int64, count=len(all_shifts))
+
+    # The employees who can take each candidate shift, with their preference and any unavailability penalty
+    options:list[list[tuple[float, float, str]]] = [list() for _ in all_shifts]
+    for emp_name, emp_data in employees.items():
+        is_qualified = np.fromiter((pname.strip() in emp_data.positions for (_, pname), _ in all_shifts), dtype=bool, count=len(all_shifts))
+        is_available = emp_data.availability.contains_batch(all_starts, all_ends)
+        if hard_availability:
+            is_qualified &= is_available
+
+        indices = np.flatnonzero(is_qualified)
+        preferences = emp_data.get_shift_preferences(all_starts[indices], all_ends[indices]) * emp_data.preference_weight * (emp_data.tenure + 1)
+        # Shifts while unavailable are only taken when no one else can
+        penalties = -10_000_000_000 * (all_ends[indices] - all_starts[indices]) * ~is_available[indices]
+        for i, preference, penalty in zip(indices.tolist(), preferences.tolist(), penalties.tolist()):
+            options[i].append((preference, penalty, emp_name))
+
+    shifts_by_position:dict[int, list[int]] = defaultdict(list)
+    shifts_by_start:dict[tuple[int, int], list[int]] = defaultdict(list)
+    for i, ((pid, _), shift) in enumerate(all_shifts):
+        shifts_by_position[pid].append(i)
+        shifts_by_start[(pid, shift.start)].append(i)
+
+    # What each employee already works, starting with the assignments made outside this schedule
+    day_shifts:dict[tuple[str, int], list[MinuteSpan]] = defaultdict(list)
+    week_minutes:dict[tuple[str, tuple[int, int]], int] = defaultdict(int)
+    slots:dict[tuple[str, int, int, int], int] = defaultdict(int)
+
+    def weekly_cap(emp_data:Employee) -> float:
+        if emp_data.maximum_hours == None or emp_data.maximum_hours <= 0:
+            return max_hours_per_week * 60
+        return min(max_hours_per_week, emp_data.maximum_hours) * 60
+
+    def fits(emp_name:str, shift:MinuteSpan) -> bool:
+        same_day = day_shifts.get((emp_name, shift.day), [])
+        if len(same_day) >= max_shifts_per_day or any(shift.overlaps_with(other) for other in same_day):
+            return False
+
+        # Constraints: Employees cannot work closing then open the next day
+        if (shift.start % MINUTES_PER_DAY) // 60 <= 10 and any((other.end % MINUTES_PER_DAY) // 60 >= 20 for other in day_shifts.get((emp_name, shift.day - 1), [])):
+            return False
+        if (shift.end % MINUTES_PER_DAY) // 60 >= 20 and any((other.start % MINUTES_PER_DAY) // 60 <= 10 for other in day_shifts.get((emp_name, shift.day + 1), [])):
+            return False
+        return week_minutes.get((emp_name, week_of_day(shift.day)), 0) + shift.length <= weekly_cap(employees[emp_name])
+
+    def score(emp_name:str, shift:MinuteSpan, base:float, capacity_first:bool) -> float:
+        emp_data = employees[emp_name]
+        worked = week_minutes.get((emp_name, week_of_day(shift.day)), 0)
+        if capacity_first:
+            # Fewer, longer shifts taken by whoever has the most hours left leave the most room for later timelines
+            return base + 1000 * shift.length + weekly_cap(emp_data) - worked
+
+        if slots.get((emp_name, *slot_of(shift)), 0) > 0:
+            base += consistent_shift_weight
+        if emp_data.preferred_hours == None or float(emp_data.preferred_hours) in (0.0, float('inf'), float('-inf'), float('nan')):
+            return base
+        preferred = min(max_hours_per_week * 60, max(0, int(emp_data.preferred_hours * 60)))
+        if preferred == 0:
+            return base
+        deviation_change = (abs(worked + shift.length - preferred) - abs(worked - preferred)) * 100 / preferred
+        return base - 5 * deviation_change * emp_data.deviation_weight * (emp_data.tenure + 1)
+
+    def assign(emp_name:str, shift:MinuteSpan, sign:int):
+        if sign > 0: day_shifts[(emp_name, shift.day)].append(shift)
+        else:        day_shifts[(emp_name, shift.day)].remove(shift)
+        week_minutes[(emp_name, week_of_day(shift.day))] += sign * shift.length
+        slots[(emp_name, *slot_of(shift))] += sign
+
+    def fill(pid:int, cursor:int, end:int, reachable:set[int], capacity_first:bool, attempts:list[int]) -> list[tuple[int, str]] | None:
+        """Assigns shifts from cursor to the end of a timeline, backtracking when it cannot be finished."""
+        if cursor == end:
+            return []
+
+        choices = []
+        for i in shifts_by_start.get((pid, cursor), []):
+            shift = all_shifts[i][1]
+            if shift.end not in reachable:
+                continue
+            for preference, penalty, emp_name in options[i]:
+                if fits(emp_name, shift):
+                    choices.append((score(emp_name, shift, penalty if capacity_first else preference + penalty, capacity_first), i, emp_name))
+        choices.sort(key=lambda choice: -choice[0])
+
+        for _, i, emp_name in choices:
+            if attempts[0] <= 0:
+                return None
+            attempts[0] -= 1
+
+            shift = all_shifts[i][1]
+            assign(emp_name, shift, 1)
+            rest = fill(pid, shift.end, end, reachable, capacity_first, attempts)
+            if rest != None:
+                return [(i, emp_name)] + rest
+            assign(emp_name, shift, -1)
+        return None
+
+    # The shift boundaries from which the end of each timeline can be reached, found back to front
+    windows = list()
+    for pid in sorted(range(len(to_schedule)), key=lambda pid: to_schedule[pid][1].start):
+        window = MinuteSpan.from_timespan(to_schedule[pid][1])
+        reachable = {window.end}
+        for i in sorted(shifts_by_position.get(pid, []), key=lambda i: -all_shifts[i][1].start):
+            if all_shifts[i][1].end in reachable:
+                reachable.add(all_shifts[i][1].start)
+        windows.append((pid, window, reachable))
+
+    # When filling by score runs out of employees, fill again using up as little of them as possible
+    schedule = None
+    for capacity_first in (False, True):
+        day_shifts.clear()
+        week_minutes.clear()
+        slots.clear()
+        for emp_name, _, shift in fixed_schedule or []:
+            shift = MinuteSpan.from_timespan(shift)
+            day_shifts[(emp_name, shift.day)].append(shift)
+            week_minutes[(emp_name, week_of_day(shift.day))] += shift.length
+            slots[(emp_name, *slot_of(shift))] += 1
+
+        schedule = list()
+        attempts = [max_backtracks]
+        for pid, window, reachable in windows:
+            assignments = fill(pid, window.start, window.end, reachable, capacity_first, attempts)
+            if assignments == None:
+                schedule = None
+                break
+            schedule.extend((emp_name, to_schedule[pid][0], all_shifts[i][1].to_timespan()) for i, emp_name in assignments)
+        if schedule != None:
+            break
+
+    if stats != None: stats.phase_times["greedy"] = stats.phase_times.get("greedy", 0.0) + perf_counter() - greedy_start
+    return schedule
+
+def _max_matching(options:list[list[int]]) -> int:
+    """The most items that can each be given a different one of their options (augmenting paths)."""
+    matched:dict[int, int] = dict()
+    
+    def augment(i:int, visited:set[int]) -> bool:
+        for option in options[i]:
+            if option in visited:
+                continue
+            visited.add(option)
+            if option not in matched or augment(matched[option], visited):
+                matched[option] = i
+                return True
+        return False
+    
+    return sum(augment(i, set()) for i in range(len(options)))
+
+def check_feasibility(
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        max_hours_per_week=18,
+        shift_lengths=[3, 4],
+        absolute_shift_minimum_length=2.5,
+        max_shifts_per_day=1,
+        hard_availability=True,
+        stats:ScheduleStats=None
+    ) -> FeasibilityReport:
+    """
+    Checks in milliseconds whether the positions to fill can be staffed at all, without building a model.
+    Every finding is a reason build_model's model has no solution:
+    - Uncovered windows: no candidate shift of the position covering them can go to a qualified employee
+      (who must also be available, with hard_availability).
+    - Understaffed windows: more positions are open at once than there are employees
+      who can each take a different one of them.
+    - Weekly shortfalls: a position, or a group of positions sharing employees, needs more hours in a week
+      than its employees can work, given their weekly hour limits, shifts per day and the longest shift they can take.
+    Assignments of a fixed schedule only take away from what employees can work, so they are not considered.
+    """
+    precheck_start = perf_counter()
+    report = FeasibilityReport()
+    all_shifts = generate_shifts(to_schedule, shift_lengths, absolute_shift_minimum_length)
+    all_starts = np.fromiter((shift.start  for _, shift in all_shifts), dtype=np.int64, count=len(all_shifts))
+    all_ends   = np.fromiter((shift.end    for _, shift in all_shifts), dtype=np.int64, count=len(all_shifts))
+    all_days   = np.fromiter((shift.day    for _, shift in all_shifts), dtype=np.int64, count=len(all_shifts))
+    
+    # Which employee (row) can take which candidate shift (column)
+    position_names = sorted(set(position.strip() for position, _ in to_schedule))
+    position_ids = {position: i for i, position in enumerate(position_names)}
+    shift_positions = np.fromiter((position_ids[pname.strip()] for (_, pname), _ in all_shifts), dtype=np.int64, count=len(all_shifts))
+    emp_names = list(employees)
+    qualified = np.array([[position in emp_data.positions for position in position_names] for emp_data in employees.values()], dtype=bool).reshape(len(emp_names), len(position_names))
+    can_take = qualified[:, shift_positions]
+    if hard_availability:
+        for e, emp_data in enumerate(employees.values()):
+            can_take[e] &= emp_data.availability.contains_batch(all_starts, all_ends)
+    takeable = can_take.any(axis=0)
+    
+    shifts_by_position:dict[int, np.ndarray] = defaultdict(lambda: np.zeros(0, dtype=np.int64))
+    pids = np.fromiter((pid for (pid, _), _ in all_shifts), dtype=np.int64, count=len(all_shifts))
+    for pid in np.unique(pids[takeable]).tolist():
+        shifts_by_position[pid] = np.flatnonzero(takeable & (pids == pid))
+    
+    # Sweep each day's timeline, cut at every window and shift boundary, matching open positions to employees
+    windows_by_day:dict[int, list[int]] = defaultdict(list)
+    for pid, (_, timespan) in enumerate(to_schedule):
+        windows_by_day[MinuteSpan.from_timespan(timespan).day].append(pid)
+    
+    for day, day_pids in windows_by_day.items():
+        windows = {pid: MinuteSpan.from_timespan(to_schedule[pid][1]) for pid in day_pids}
+        boundaries = set()
+        for pid in day_pids:
+            boundaries.update((windows[pid].start, windows[pid].end))
+            boundaries.update(all_starts[shifts_by_position[pid]].tolist())
+            boundaries.update(all_ends[shifts_by_position[pid]].tolist())
+        boundaries = sorted(boundaries)
+        
+        uncovered_since:dict[int, int] = dict()
+        for segment_start, segment_end in zip(boundaries, boundaries[1:]):
+            open_pids = [pid for pid in day_pids if windows[pid].start <= segment_start and segment_end <= windows[pid].end]
+            options = []
+            for pid in open_pids:
+                covering = shifts_by_position[pid]
+                covering = covering[(all_starts[covering] <= segment_start) & (all_ends[covering] >= segment_end)]
+                options.append(np.flatnonzero(can_take[:, covering].any(axis=1)).tolist())
+            
+            # Consecutive uncovered segments of a position are reported as one window
+            for pid, pid_options in zip(open_pids, options):
+                if len(pid_options) == 0:
+                    uncovered_since.setdefault(pid, segment_start)
+            for pid in list(uncovered_since):
+                if pid not in open_pids or len(options[open_pids.index(pid)]) > 0:
+                    report.uncovered.append((to_schedule[pid][0], MinuteSpan(uncovered_since.pop(pid), segment_start).to_timespan()))
+            
+            if any(len(pid_options) == 0 for pid_options in options):
+                continue
+            able = _max_matching(options)
+            if able < len(open_pids):
+                positions = [to_schedule[pid][0] for pid in open_pids]
+                window = MinuteSpan(segment_start, segment_end).to_timespan()
+                last = report.understaffed[-1] if report.understaffed else None
+                if last != None and last[0] == positions and last[2:] == (len(open_pids), able) and last[1].end == window.start:
+                    report.understaffed[-1] = (positions, Timespan(last[1].start, window.end), len(open_pids), able)
+                else:
+                    report.understaffed.append((positions, window, len(open_pids), able))
+        for pid, since in uncovered_since.items():
+            report.uncovered.append((to_schedule[pid][0], MinuteSpan(since, boundaries[-1]).to_timespan()))
+    
+    # Compare each week's hours to fill with the most the qualified employees can work,
+    # for every position on its own and for every group of positions that share employees.
+    # Windows running into the next week are left out, as their shifts may count towards either week
+    groups = [[position] for position in position_names]
+    groups += [g for g in (sorted(set(to_schedule[pid][0].strip() for pid in pids)) for pids, _ in find_components(to_schedule, employees)) if len(g) > 1]
+    
+    needed:dict[tuple[tuple[int, int], str], int] = defaultdict(int)
+    for position, timespan in to_schedule:
+        window = MinuteSpan.from_timespan(timespan)
+        if week_of_day(window.day) == week_of_day((window.end - 1) // MINUTES_PER_DAY):
+            needed[(week_of_day(window.day), position.strip())] += window.length
+    
+    hour_limits = np.array([
+        max_hours_per_week * 60 if emp_data.maximum_hours == None or emp_data.maximum_hours <= 0 else min(max_hours_per_week, emp_data.maximum_hours) * 60
+        for emp_data in employees.values()
+    ], dtype=float)
+    all_lengths = np.where(can_take, all_ends - all_starts, 0)
+    all_weeks = np.array([week_of_day(day) for day in all_days.tolist()]).reshape(len(all_shifts), 2)
+    
+    for week in sorted(set(week for week, _ in needed)):
+        in_week = (all_weeks[:, 0] == week[0]) & (all_weeks[:, 1] == week[1])
+        for group in groups:
+            group_needed = sum(needed.get((week, position), 0) for position in group)
+            if group_needed == 0:
+                continue
+            
+            # Each employee works at most max_shifts_per_day of the longest shift they can take each day
+            in_group = in_week & np.isin(shift_positions, [position_ids[position] for position in group])
+            most_per_day = np.zeros(len(emp_names))
+            for day in np.unique(all_days[in_group]).tolist():
+                most_per_day += all_lengths[:, in_group & (all_days == day)].max(axis=1)
+            group_able = np.minimum(hour_limits, max_shifts_per_day * most_per_day).sum()
+            
+            if group_able < group_needed:
+                report.weekly_shortfalls.append((week, group, group_needed / 60, group_able / 60))
+    
+    if stats != None:
+        stats.feasibility = report
+        stats.phase_times["precheck"] = stats.phase_times.get("precheck", 0.0) + perf_counter() - precheck_start
+    return report
+
+def build_model(
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        max_hours_per_week=18,
+        shift_lengths=[3, 4],
+        min_one_shift_per_employee=False,
+        absolute_shift_minimum_length=2.5,
+        max_shifts_per_day=1,
+        shift_granularity=1,
+        consistent_shift_weight=1.5,
+        hard_availability=False,
+        deviation_encoding="linear",
+        fixed_schedule:list[tuple[str, str, Timespan]]=None,
+        previous_schedule:list[tuple[str, str, Timespan]]=None,
+        stats:ScheduleStats=None
+    ) -> ScheduleModel | None:
+    """
+    Builds the CP-SAT model for a scheduling problem without solving it.
+    Returns None if there are no shifts to schedule.
+    
+    With hard_availability, shifts an employee is unavailable for get no variable at all
+    instead of a heavily penalized one.
+    
+    deviation_encoding selects how the percent deviation from preferred hours is modeled:
+    "linear" uses a plain absolute value scaled by a constant (fast),
+    "division" computes an integer percentage with a division constraint.
+    
+    fixed_schedule holds assignments made outside this model (e.g. earlier weeks of a rolling horizon).
+    They are not changed, but count towards daily and weekly limits, the no closing then opening rule,
+    minimum shifts and consistent shifts.
+    
+    previous_schedule (e.g. the result of the last solve before an edit) is given to the solver as a hint:
+    its matching shifts start out assigned and every other shift unassigned, so the search starts from it.
+    
+    If stats is given, the time and model growth of each build phase are recorded into it.
+    """
+    
+    from ortools.sat.python import cp_model
+    model = cp_model.CpModel()
+    mark = stats.phase_marker(model) if stats != None else lambda phase: None
+    
+    all_shifts = generate_shifts(to_schedule, shift_lengths, absolute_shift_minimum_length)
+    mark("candidate shifts")
     if len(all_shifts) == 0:
         print("No shifts to schedule.")
         return None
 
+    all_starts = np.fromiter((shift.start for _, shift in all_shifts), dtype=np.int64, count=len(all_shifts))
+    all_ends   = np.fromiter((shift.end   for _, shift in all_shifts), dtype=np.int64, count=len(all_shifts))
+    
+    # Assignments made outside this model, only those near its horizon can interact with it
+    fixed_by_employee:dict[str, list[MinuteSpan]] = defaultdict(list)
+    fixed_week_seconds:dict[tuple[str, tuple[int, int]], int] = defaultdict(int)
+    fixed_day_counts:dict[tuple[str, int], int] = defaultdict(int)
+    fixed_slots:set[tuple[str, int, int, int]] = set()
+    for emp_name, _, shift in fixed_schedule or []:
+        if emp_name not in employees:
+            continue
+        shift = MinuteSpan.from_timespan(shift)
+        fixed_by_employee[emp_name].append(shift)
+        fixed_week_seconds[(emp_name, week_of_day(shift.day))] += shift.length * 60
+        fixed_day_counts[(emp_name, shift.day)] += 1
+        fixed_slots.add((emp_name, *slot_of(shift)))
+    
     # Generate corresponding variables for each shift
-    shift_vars:dict[tuple[str, int, Timespan], cp_model.IntVar] = dict()
+    shift_vars:dict[ShiftKey, 'cp_model.IntVar'] = dict()
     for emp_name, emp_data in employees.items():
-        for (pid, pname), shift in all_shifts:
-            if pname.strip() in emp_data.positions:
-                shift_vars[(emp_name, pid, shift)] = model.NewBoolVar(f'shift_e{emp_name}_p{pid}_s{shift}')
+        is_qualified = np.fromiter((pname.strip() in emp_data.positions for (_, pname), _ in all_shifts), dtype=bool, count=len(all_shifts))
+        if hard_availability:
+            is_qualified &= emp_data.availability.contains_batch(all_starts, all_ends)
+        if emp_name in fixed_by_employee:
+            is_qualified &= ~_blocked_by_fixed(fixed_by_employee[emp_name], all_starts, all_ends, max_shifts_per_day)
+        
+        for i in np.flatnonzero(is_qualified).tolist():
+            (pid, pname), shift = all_shifts[i]
+            shift_vars[(emp_name, pid, shift)] = model.NewBoolVar(f'shift_e{emp_name}_p{pid}_s{shift}')
+    
+    index = ShiftIndex.build(shift_vars.keys())
+    
+    # Hueristic: Start the search from the previous schedule
+    if previous_schedule:
+        _add_schedule_hint(model, shift_vars, to_schedule, previous_schedule)
+    mark("shift variables")
     
     # Constraints: Each employee must work at least one shift per scheduling period
     if min_one_shift_per_employee:
         for emp_name, emp_data in employees.items():
-            possible_shifts = [shift_vars[(emp_name, pid, shift)] for (pid, _), shift in all_shifts if (emp_name, pid, shift) in shift_vars]
+            if emp_name in fixed_by_employee:
+                continue
+            possible_shifts = [shift_vars[key] for key in index.by_employee.get(emp_name, [])]
             if len(possible_shifts) > 0:
                 model.Add(sum(possible_shifts) >= 1)
             else:
                 print(f"Employee {emp_name} has not qualified for any shifts. Quals: {emp_data.positions} Positions: {set(p for p, _ in to_schedule)}")
+        mark("minimum shifts")
         
     # Constraints: Ensure every position has exactly 1 employee at all times
+    # Each position's timeline is cut into elementary segments between distinct shift boundaries,
+    # within which the set of covering shifts cannot change
+    coverage_constraints:set[frozenset] = set()
+    uncovered:list[tuple[str, Timespan]] = []
     for pid, (position, timespan) in enumerate(to_schedule):
-        MINS_PER_CHECK = 5
-        current_time = timespan.start
-        while current_time <= timespan.end:
-            # Get all shifts that overlap with the current time
-            shifts_at_time = [shift_vars[(emp_name, pid_s, shift)] for emp_name, pid_s, shift in shift_vars if pid == pid_s and shift.overlaps_with(Timespan(current_time, current_time + timedelta(minutes=MINS_PER_CHECK)))]
+        pid_shifts = [(key[2], shift_vars[key]) for key in index.by_position.get(pid, [])]
+        for segment, shifts_in_segment in segment_cover(MinuteSpan.from_timespan(timespan), pid_shifts):
+            if len(shifts_in_segment) == 0:
+                uncovered.append((position, segment.to_timespan()))
+            
+            # Identical segments (e.g. a long stretch with no shift boundaries) yield identical constraints
+            key = frozenset(var.Index() for var in shifts_in_segment)
+            if key in coverage_constraints:
+                continue
+            coverage_constraints.add(key)
+            
             # Add a constraint that there must be exactly 1 employee working at this time
-            model.Add(sum(shifts_at_time) == 1)
-            current_time += timedelta(minutes=MINS_PER_CHECK)
+            model.Add(sum(shifts_in_segment) == 1)
+    mark("coverage")
     
     # Constraints: Ensure no overlapping shifts for the same employee
-    for emp_name_1, pid_1, shift_1 in shift_vars:
-        for emp_name_2, pid_2, shift_2 in shift_vars:
-            if emp_name_1 == emp_name_2 and shift_1.overlaps_with(shift_2) and ((shift_1 != shift_2) or (shift_1 == shift_2 and pid_1 != pid_2)):
-                model.Add(shift_vars[(emp_name_1, pid_1, shift_1)] + shift_vars[(emp_name_2, pid_2, shift_2)] <= 1)
+    # At most one shift out of every group of mutually overlapping shifts
+    for emp_name, emp_keys in index.by_employee.items():
+        for clique in overlap_cliques([(key[2], shift_vars[key]) for key in emp_keys]):
+            model.AddAtMostOne(clique)
+    mark("no overlap")
     
     # Constraints: Limit the number of shifts each employee can work per day
-    for emp_name in employees.keys():
-        all_shifts_per_day:dict[int, list[tuple[str, int, Timespan]]] = dict() # maps day -> list of shifts
-        for pid, (position, timespan) in enumerate(to_schedule):
-            day = timespan.start.date().day
-            shifts_for_emp = [(emp_name_s, pid, shift) for emp_name_s, pid_s, shift in shift_vars if emp_name_s == emp_name and pid == pid_s]
-            
-            if day not in all_shifts_per_day:
-                all_shifts_per_day[day] = []
-            all_shifts_per_day[day].extend(shifts_for_emp)
-        
-        for day, shifts in all_shifts_per_day.items():
-            model.Add(sum(shift_vars[shift_tuple] for shift_tuple in shifts) <= max_shifts_per_day)
+    for (emp_name, day), day_keys in index.by_employee_day.items():
+        model.Add(sum(shift_vars[key] for key in day_keys) <= max_shifts_per_day - fixed_day_counts.get((emp_name, day), 0))
         
         # Constraints: Employees cannot work closing then open the next day
-        for day, day_shift_list in all_shifts_per_day.items():
-            next_day = day + 1
-            if next_day not in all_shifts_per_day:
-                continue
-            
-            for (emp_name_1, pid_1, shift_1) in day_shift_list:
-                if shift_1.end.hour >= 20:
-                    for (emp_name_2, pid_2, shift_2) in all_shifts_per_day[next_day]:
-                        if shift_2.start.hour <= 10 and emp_name_1 == emp_name_2:
-                            model.Add(shift_vars[(emp_name_1, pid_1, shift_1)] + shift_vars[(emp_name_2, pid_2, shift_2)] <= 1)
-    
+        next_day_keys = index.by_employee_day.get((emp_name, day + 1), [])
+        closing_keys = [key for key in day_keys      if (key[2].end   % MINUTES_PER_DAY) // 60 >= 20]
+        opening_keys = [key for key in next_day_keys if (key[2].start % MINUTES_PER_DAY) // 60 <= 10]
+        for closing_key in closing_keys:
+            for opening_key in opening_keys:
+                model.Add(shift_vars[closing_key] + shift_vars[opening_key] <= 1)
+    mark("daily limits")
     
     # Constraints: Limit the total number of hours each employee can work per week
     # Also: Huertistic to minimize deviation from preferred hours
-    # Also: Huertistic to minimize time people work while unavailable
     deviation_terms = []
-    for week in set(shift.start.date().isocalendar().week for _, shift in to_schedule):
+    for week in set(week_of(shift.start.date()) for _, shift in to_schedule):
         for emp_name, emp_data in employees.items():
-            total_time_worked = sum(
-                int(shift.length.total_seconds()) * shift_vars[(emp_name_s, pid_s, shift)]
-                for emp_name_s, pid_s, shift in shift_vars
-                if emp_name_s == emp_name and shift.start.date().isocalendar().week == week
+            total_time_worked = fixed_week_seconds.get((emp_name, week), 0) + sum(
+                shift.length * 60 * shift_vars[(emp_name_s, pid_s, shift)]
+                for emp_name_s, pid_s, shift in index.by_employee_week.get((emp_name, week), [])
             )
             model.Add(total_time_worked <= max_hours_per_week * 3600)
             if emp_data.maximum_hours != None and emp_data.maximum_hours > 0:
@@ -162,79 +826,82 @@ def create_schedule(
             preferred_time = int(emp_data.preferred_hours * 3600)
             preferred_time = max(0, preferred_time)
             preferred_time = min(max_hours_per_week * 3600, preferred_time)
-            
-            over_preferred = model.NewBoolVar(f'over_preferred_e{emp_name}')
-            under_preferred = model.NewBoolVar(f'under_preferred_e{emp_name}')
-            model.Add(over_preferred + under_preferred == 1)
+            if preferred_time == 0:
+                continue
             
             deviation_from_preferred = model.NewIntVar(0, 3600*max_hours_per_week, f'deviation_e{emp_name}')
-            model.Add(total_time_worked - preferred_time <= deviation_from_preferred).OnlyEnforceIf(over_preferred)
-            model.Add(preferred_time - total_time_worked <= deviation_from_preferred).OnlyEnforceIf(under_preferred)
-            model.Add(total_time_worked - preferred_time >= 0).OnlyEnforceIf(over_preferred)
-            model.Add(total_time_worked - preferred_time <= 0).OnlyEnforceIf(under_preferred)
             
-            percent_difference = model.NewIntVar(0, 100, f'percent_diff_e{emp_name}')
-            model.AddDivisionEquality(percent_difference, 100 * deviation_from_preferred, preferred_time)
+            if deviation_encoding == "linear":
+                # The deviation is pushed down onto |total - preferred| by the objective,
+                # and scaled to a percentage with a precomputed coefficient instead of a division constraint
+                model.Add(total_time_worked - preferred_time <= deviation_from_preferred)
+                model.Add(preferred_time - total_time_worked <= deviation_from_preferred)
+                percent_difference = deviation_from_preferred * (100 / preferred_time)
+                
+            elif deviation_encoding == "division":
+                over_preferred = model.NewBoolVar(f'over_preferred_e{emp_name}')
+                under_preferred = model.NewBoolVar(f'under_preferred_e{emp_name}')
+                model.Add(over_preferred + under_preferred == 1)
+                
+                model.Add(total_time_worked - preferred_time <= deviation_from_preferred).OnlyEnforceIf(over_preferred)
+                model.Add(preferred_time - total_time_worked <= deviation_from_preferred).OnlyEnforceIf(under_preferred)
+                model.Add(total_time_worked - preferred_time >= 0).OnlyEnforceIf(over_preferred)
+                model.Add(total_time_worked - preferred_time <= 0).OnlyEnforceIf(under_preferred)
+                
+                percent_difference = model.NewIntVar(0, 100, f'percent_diff_e{emp_name}')
+                model.AddDivisionEquality(percent_difference, 100 * deviation_from_preferred, preferred_time)
+            
+            else:
+                raise ValueError(f"Unknown deviation encoding: {deviation_encoding}")
             
             deviation_terms.append(percent_difference * emp_data.deviation_weight * (emp_data.tenure + 1))            
+    mark("weekly hours")
         
+    # Every candidate shift of an employee is scored in a single vectorized call
+    emp_minutes:dict[str, tuple[np.ndarray, np.ndarray]] = dict()
+    for emp_name, emp_keys in index.by_employee.items():
+        starts = np.fromiter((shift.start for _, _, shift in emp_keys), dtype=np.int64, count=len(emp_keys))
+        ends   = np.fromiter((shift.end   for _, _, shift in emp_keys), dtype=np.int64, count=len(emp_keys))
+        emp_minutes[emp_name] = (starts, ends)
+    
     # Hueristic: Maximizing shift preferences
     satisfaction_terms = []
-    for emp_name, pid, shift in shift_vars:
+    for emp_name, emp_keys in index.by_employee.items():
         employee = employees[emp_name]
-        satisfaction = employee.get_shift_preference(shift)
-        satisfaction_terms.append(shift_vars[(emp_name, pid, shift)] * satisfaction * employee.preference_weight * (employee.tenure + 1))
+        satisfactions = employee.get_shift_preferences(*emp_minutes[emp_name])
+        for key, satisfaction in zip(emp_keys, satisfactions.tolist()):
+            satisfaction_terms.append(shift_vars[key] * satisfaction * employee.preference_weight * (employee.tenure + 1))
         
     # Hueristic: Minimizing time worked while unavailable
     hours_worked_unavailable_terms = []
-    for emp_name, pid, shift in shift_vars:
-        employee = employees[emp_name]
-        is_available = any(shift in timespan for timespan in employee.availability)
-        if not is_available:
-            hours_worked_unavailable_terms.append( shift_vars[(emp_name, pid, shift)] * int(shift.length.total_seconds()) )
+    for emp_name, emp_keys in index.by_employee.items():
+        is_available = employees[emp_name].availability.contains_batch(*emp_minutes[emp_name])
+        for key, available in zip(emp_keys, is_available.tolist()):
+            if not available:
+                hours_worked_unavailable_terms.append( shift_vars[key] * key[2].length * 60 )
+    mark("preferences")
         
     # Hueristic: People prefer consistent shifts
+    # Shifts are grouped per employee by weekday and start time (emp_name, weekday, start_hour, start_minute).
+    # Each shift worked in a slot after the first is rewarded, using one "slot used" indicator per slot,
+    # so the model grows linearly with the horizon instead of with every pair of weeks
     consistent_shift_reward_terms = []
-    
-    # Group shifts by weekday and time
-    # [(weekday, start_hour, start_minute) -> [(emp_name, pid, shift)]]
-    weekday_time_shifts = defaultdict(list)
-    
-    for emp_name, pid, shift in shift_vars:
-        weekday = shift.start.weekday()  # 0=Monday, 1=Tuesday, etc.
-        start_hour = shift.start.hour
-        start_minute = shift.start.minute
-        shift_key = (weekday, start_hour, start_minute)
-        weekday_time_shifts[shift_key].append((emp_name, pid, shift))
-    
-    # For each employee and weekday+time, add rewards for consistency
-    for shift_key, shifts in weekday_time_shifts.items():
-        # Group by employee
-        emp_shifts = defaultdict(list)
-        for emp_name, pid, shift in shifts:
-            emp_shifts[emp_name].append((pid, shift))
+    for slot, slot_keys in index.by_employee_slot.items():
+        emp_name, weekday, start_hour, start_minute = slot
+        if slot in fixed_slots:
+            # The slot was already used by a fixed assignment, so every shift in it is a repeat
+            consistent_shift_reward_terms.append(consistent_shift_weight * sum(shift_vars[key] for key in slot_keys))
+            continue
+        if len(set(shift.day for _, _, shift in slot_keys)) < 2:
+            continue
         
-        for emp_name, emp_shifts_list in emp_shifts.items():
-            if len(emp_shifts_list) > 1: 
-                for i, (pid1, shift1) in enumerate(emp_shifts_list):
-                    for j, (pid2, shift2) in enumerate(emp_shifts_list[i+1:], i+1):
-                        if shift1.start.date() != shift2.start.date():  # Different days
-                            # Create a new boolean variable for this pair of shifts
-                            pair_var = model.NewBoolVar(f'consistent_pair_e{emp_name}_s{i}_{j}')
-                            
-                            # This variable is 1 iff both shifts are assigned to this employee
-                            model.AddBoolAnd([
-                                shift_vars[(emp_name, pid1, shift1)], 
-                                shift_vars[(emp_name, pid2, shift2)]
-                            ]).OnlyEnforceIf(pair_var)
-                            
-                            model.AddBoolOr([
-                                shift_vars[(emp_name, pid1, shift1)].Not(), 
-                                shift_vars[(emp_name, pid2, shift2)].Not()
-                            ]).OnlyEnforceIf(pair_var.Not())
-                            
-                            # Add reward for this consistent pair
-                            consistent_shift_reward_terms.append(consistent_shift_weight * pair_var)
+        slot_used = model.NewBoolVar(f'consistent_slot_e{emp_name}_d{weekday}_t{start_hour}:{start_minute}')
+        for key in slot_keys:
+            model.AddImplication(shift_vars[key], slot_used)
+        
+        # Add reward for the number of repeats in this slot
+        consistent_shift_reward_terms.append(consistent_shift_weight * (sum(shift_vars[key] for key in slot_keys) - slot_used))
+    mark("consistency")
                             
     # Minimize the deviation from preferred hours and maximize satisfaction
     model.Minimize(
@@ -243,28 +910,643 @@ def create_schedule(
         10_000_000_000 * sum(hours_worked_unavailable_terms) - # Minimize (hours worked while unavailable)
         sum(consistent_shift_reward_terms)  # Maximize (consistent shifts)
     )
-    # Solving the model
+    mark("objective")
+    
+    return ScheduleModel(model, shift_vars, index, to_schedule, uncovered)
+
+def make_solver(solver_max_time=10, solver_seed=0, num_workers=0) -> 'cp_model.CpSolver':
+    """
+    Creates a CP-SAT solver with the parameters used for all schedules.
+    num_workers limits the solver's search threads; 0 lets CP-SAT use every core.
+    A solver_max_time of 0 means no time limit; a negative one (an exhausted budget) still ends the search right away.
+    """
+    from ortools.sat.python import cp_model
     solver = cp_model.CpSolver()
     solver.parameters.random_seed = solver_seed
+    if num_workers > 0: solver.parameters.num_workers = num_workers
     # solver.parameters.log_to_stdout = True
     # solver.parameters.log_search_progress = True
     solver.parameters.linearization_level = 2   # Use more aggressive linearization
     #solver.parameters.use_branching_in_lp = True
     solver.parameters.optimize_with_core = True
     
-    if solver_max_time > 0: solver.parameters.max_time_in_seconds = solver_max_time
+    if solver_max_time != 0: solver.parameters.max_time_in_seconds = max(0.01, solver_max_time)
+    return solver
+
+def complete_hint(schedule_model:ScheduleModel, solver_max_time=10, num_workers=0) -> bool:
+    """
+    Extends a model's hint, which only covers shift variables, to every variable of the model
+    by solving with the shift variables fixed to their hinted values.
+    CP-SAT often ignores a partial hint, but starts from a complete one right away.
+    Returns whether the hint was feasible and completed; otherwise it is left as is.
+    """
+    if schedule_model.hint_complete:
+        return True
+    proto = schedule_model.model.Proto()
+    if len(proto.solution_hint.vars) == 0:
+        return False
+    
+    from ortools.sat.python import cp_model
+    solver = make_solver(solver_max_time, 0, num_workers)
+    solver.parameters.fix_variables_to_their_hinted_value = True
+    status = solver.Solve(schedule_model.model)
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        return False
+    
+    values = list(solver.ResponseProto().solution)
+    schedule_model.model.ClearHints()
+    proto.solution_hint.vars.extend(range(len(values)))
+    proto.solution_hint.values.extend(values)
+    schedule_model.hint_complete = True
+    return True
+
+def solve_model(
+        schedule_model:ScheduleModel,
+        solver_max_time=10,
+        solver_seed=0,
+        stats:ScheduleStats=None,
+        num_workers=0,
+        cancel:threading.Event=None,
+        on_solution:callable=None
+    ) -> list[tuple[str, str, Timespan]] | None:
+    """
+    Solves a built model. Returns the schedule, or None if no feasible schedule was found.
+    If stats is given, solver statistics and the objective and bound over time are recorded into it.
+    on_solution is called with a SolutionUpdate for every improving schedule, from the solver's threads.
+    Setting cancel from any thread stops the search, keeping the best schedule found so far.
+    """
+    
+    # A window no employee can cover makes the model infeasible; skip the solver
+    if len(schedule_model.uncovered) > 0:
+        if stats != None: stats.status = "UNCOVERED"
+        return None
+    
+    # Hueristic: Start the search from a complete hint, found in at most half of the time
+    hint_start = perf_counter()
+    if complete_hint(schedule_model, solver_max_time / 2, num_workers) and stats != None:
+        stats.phase_times["hint"] = stats.phase_times.get("hint", 0.0) + perf_counter() - hint_start
+    if solver_max_time != 0:
+        solver_max_time = max(0.01, solver_max_time - (perf_counter() - hint_start))
+    
+    # Solving the model
+    from ortools.sat.python import cp_model
+    solver = make_solver(solver_max_time, solver_seed, num_workers)
+    streamer = _solution_streamer_type()(schedule_model, stats, on_solution)
+    search_start = perf_counter()
+    if stats != None:
+        stats.progress.clear()
+        if hasattr(solver, 'best_bound_callback'):
+            solver.best_bound_callback = lambda bound: stats.progress.append((perf_counter() - search_start, None, bound))
+    
+    # The search can only be stopped from outside the solver's threads, so cancel is watched from another one
+    solved = threading.Event()
+    def stop_on_cancel():
+        while not solved.wait(0.1):
+            if cancel.is_set():
+                solver.StopSearch()
+                return
+    if cancel != None:
+        threading.Thread(target=stop_on_cancel, daemon=True).start()
+    
+    try:
+        status = solver.Solve(schedule_model.model, streamer)
+    finally:
+        solved.set()
     
-    status = solver.Solve(model)
+    if stats != None:
+        stats.phase_times["solve"] = stats.phase_times.get("solve", 0.0) + perf_counter() - search_start
+        stats.status = solver.StatusName(status)
+        stats.conflicts += solver.NumConflicts()
+        stats.branches += solver.NumBranches()
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            stats.objective = solver.ObjectiveValue()
+            stats.best_bound = solver.BestObjectiveBound()
 
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        schedule = list()
-        pid_to_position = {pid: position for pid, (position, _) in enumerate(to_schedule)}
-        for (emp_name, pid, shift), var in shift_vars.items():
-            if solver.Value(var) == 0: continue
-            schedule.append((emp_name, pid_to_position[pid], shift))
+        return schedule_model.extract_schedule(solver)
+    return None
+
+def stream_model(
+        schedule_model:ScheduleModel,
+        solver_max_time=10,
+        solver_seed=0,
+        num_workers=0,
+        cancel:threading.Event=None,
+        stats:ScheduleStats=None
+    ) -> Iterator[SolutionUpdate]:
+    """
+    Solves a built model with solve_model in a background thread, yielding each improving schedule as it is found.
+    Closing the generator, or setting cancel from any thread, stops the search.
+    """
+    updates = queue.Queue()
+    stop = threading.Event()
+    errors = []
+    
+    def solve():
+        try:
+            solve_model(schedule_model, solver_max_time, solver_seed, stats, num_workers, stop, updates.put)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            updates.put(None)
+    
+    thread = threading.Thread(target=solve, daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                # Wake up regularly to notice cancellation while no solutions arrive
+                update = updates.get(timeout=0.1)
+            except queue.Empty:
+                if cancel != None and cancel.is_set():
+                    break
+                continue
+            if update == None:
+                break
+            yield update
+    finally:
+        stop.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+def stream_schedule(
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        solver_max_time=10,
+        solver_seed=0,
+        hard_availability=True,
+        soft_availability_fallback=True,
+        greedy_seed=True,
+        num_workers=0,
+        quick=False,
+        every_solution=True,
+        cancel:threading.Event=None,
+        stats:ScheduleStats=None,
+        **model_args
+    ) -> Iterator[SolutionUpdate]:
+    """
+    Schedules like create_schedule, but yields every improving schedule as soon as it is found,
+    starting with the greedy schedule the search is seeded with. The last update is the best schedule.
+    Closing the generator (e.g. to keep the current best), or setting cancel from any thread, stops the search.
+    Without every_solution, the solver runs in this thread and only the schedule it ends with is yielded.
+    
+    The whole problem is solved as a single model, and schedules are not cached.
+    If stats is given, build and solve statistics are recorded into it.
+    model_args are passed on to build_model.
+    """
+    stats = stats if stats != None else ScheduleStats()
+    greedy_args = {key: model_args[key] for key in GREEDY_OPTIONS if key in model_args}
+    
+    # solver_max_time is one budget for every attempt, with the hints and searches in them
+    deadline = perf_counter() + solver_max_time if solver_max_time > 0 else None
+    def time_left() -> float:
+        # 0 means no limit to the solver, so what is left of a deadline is never less than a moment
+        return 0 if deadline == None else max(0.01, deadline - perf_counter())
+    def out_of_time() -> bool:
+        return deadline != None and perf_counter() >= deadline
+    
+    attempts = [True, False] if hard_availability and soft_availability_fallback else [hard_availability]
+    for attempt_hard_availability in attempts:
+        if cancel != None and cancel.is_set():
+            return
+        stats.hard_availability = attempt_hard_availability
+        
+        # Skip solving when the staffing can be seen to be insufficient
+        if not precheck(to_schedule, employees, attempt_hard_availability, stats, **model_args):
+            continue
+        
+        # Hueristic: Without a previous schedule, start the search from a greedy one
+        found = False
+        attempt_args = model_args
+        if quick or (greedy_seed and model_args.get('previous_schedule') is None):
+            greedy = greedy_schedule(to_schedule, employees, hard_availability=attempt_hard_availability, stats=stats, **greedy_args)
+            if quick:
+                stats.status = "UNKNOWN" if greedy == None else "FEASIBLE"
+                if greedy != None:
+                    yield SolutionUpdate(greedy, None, None, 0.0)
+                    return
+                continue
+            if greedy != None:
+                found = True
+                attempt_args = dict(model_args, previous_schedule=greedy)
+                yield SolutionUpdate(greedy, None, None, 0.0)
+        
+        schedule_model = build_model(to_schedule, employees, hard_availability=attempt_hard_availability, stats=stats, **attempt_args)
+        if schedule_model == None or (cancel != None and cancel.is_set()):
+            return
+        if out_of_time():
+            print("Ran out of time to schedule shifts.")
+            return
+        
+        # Hueristic: A previous schedule that no longer fits the inputs cannot seed the search, so a greedy one does instead
+        if greedy_seed and model_args.get('previous_schedule') is not None:
+            hint_start = perf_counter()
+            hint_completed = complete_hint(schedule_model, time_left() / 2, num_workers)
+            stats.phase_times["hint"] = stats.phase_times.get("hint", 0.0) + perf_counter() - hint_start
+            if not hint_completed:
+                greedy = greedy_schedule(to_schedule, employees, hard_availability=attempt_hard_availability, stats=stats, **greedy_args)
+                if greedy is None:
+                    schedule_model.model.ClearHints()
+                else:
+                    found = True
+                    schedule_model.hint_schedule(greedy)
+                    yield SolutionUpdate(greedy, None, None, 0.0)
+            if out_of_time():
+                print("Ran out of time to schedule shifts.")
+                return
+        
+        if every_solution:
+            for update in stream_model(schedule_model, time_left(), solver_seed, num_workers, cancel, stats):
+                found = True
+                yield update
+        else:
+            search_start = perf_counter()
+            schedule = solve_model(schedule_model, time_left(), solver_seed, stats, num_workers, cancel)
+            if schedule != None:
+                found = True
+                yield SolutionUpdate(schedule, stats.objective, stats.best_bound, perf_counter() - search_start)
+        # Only a model proven infeasible is worth retrying, one that ran out of time would only do so again
+        if found or stats.status not in ("INFEASIBLE", "UNCOVERED"):
+            return
+        if attempt_hard_availability and soft_availability_fallback:
+            print("Failed to schedule shifts within availability. Retrying while allowing shifts outside of availability.")
+
+def find_components(to_schedule: list[tuple[str, Timespan]], employees: dict[str, Employee]) -> list[tuple[list[int], list[str]]]:
+    """
+    Splits a scheduling problem into independent parts.
+    Positions are grouped whenever an employee is qualified for more than one of them,
+    so no employee (and no constraint on an employee) spans two parts.
+    
+    Returns a list of (position ids, employee names) per part.
+    Employees who are not qualified for any position are left out.
+    """
+    positions = {position.strip() for position, _ in to_schedule}
+    parent = {position: position for position in positions}
+    
+    def find(position):
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+    
+    for emp_data in employees.values():
+        qualified = [position for position in emp_data.positions if position in positions]
+        for position in qualified[1:]:
+            parent[find(position)] = find(qualified[0])
+    
+    components:dict[str, tuple[list[int], list[str]]] = defaultdict(lambda: ([], []))
+    for pid, (position, _) in enumerate(to_schedule):
+        components[find(position.strip())][0].append(pid)
+    for emp_name, emp_data in employees.items():
+        qualified = [position for position in emp_data.positions if position in positions]
+        if qualified:
+            components[find(qualified[0])][1].append(emp_name)
+    return list(components.values())
+
+# The options of build_model that greedy_schedule also takes
+GREEDY_OPTIONS = ('max_hours_per_week', 'shift_lengths', 'absolute_shift_minimum_length', 'max_shifts_per_day', 'consistent_shift_weight', 'fixed_schedule')
+# The options of build_model that check_feasibility also takes
+PRECHECK_OPTIONS = ('max_hours_per_week', 'shift_lengths', 'absolute_shift_minimum_length', 'max_shifts_per_day')
+
+def precheck(to_schedule, employees, hard_availability, stats:ScheduleStats=None, **model_args) -> bool:
+    """
+    Runs check_feasibility with the options of build_model, and prints what makes the schedule impossible.
+    Returns False if the model is certain to have no solution, so it need not be solved.
+    """
+    report = check_feasibility(
+        to_schedule, employees, hard_availability=hard_availability, stats=stats,
+        **{key: model_args[key] for key in PRECHECK_OPTIONS if key in model_args}
+    )
+    if report.feasible:
+        return True
+    
+    print(f"Shifts cannot be filled{' within availability' if hard_availability else ''}:\n{report}")
+    if stats != None: stats.status = "INFEASIBLE"
+    return False
+
+def schedule_problem(
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        solver_max_time=10,
+        solver_seed=0,
+        hard_availability=True,
+        soft_availability_fallback=True,
+        num_workers=0,
+        horizon=None,
+        repair=False,
+        quick=False,
+        greedy_seed=True,
+        stats:ScheduleStats=None,
+        **model_args
+    ) -> list[tuple[str, str, Timespan]] | None:
+    """
+    Builds and solves a single model for the whole problem, or one per window with a horizon,
+    see create_schedule. model_args are passed on to build_model.
+    """
+    if horizon != None:
+        return schedule_rolling(
+            to_schedule, employees, horizon, repair, stats=stats,
+            solver_max_time=solver_max_time,
+            solver_seed=solver_seed,
+            hard_availability=hard_availability,
+            soft_availability_fallback=soft_availability_fallback,
+            num_workers=num_workers,
+            quick=quick,
+            greedy_seed=greedy_seed,
+            **model_args
+        )
+    
+    # The same attempts as stream_schedule, keeping only the schedule the solver ends with
+    schedule = None
+    for update in stream_schedule(
+            to_schedule, employees, solver_max_time, solver_seed, hard_availability, soft_availability_fallback, greedy_seed, num_workers,
+            quick=quick, every_solution=False, stats=stats, **model_args
+        ):
+        schedule = update.schedule
+    return schedule
+
+def horizon_windows(to_schedule: list[tuple[str, Timespan]], horizon="week") -> list[list[int]]:
+    """
+    Groups the position ids of to_schedule into consecutive windows, in order.
+    horizon is either "week" for ISO weeks, or a number of days.
+    """
+    if horizon != "week" and (not isinstance(horizon, int) or horizon < 1):
+        raise ValueError(f"Unknown horizon: {horizon}")
+    
+    first_day = min(timespan.start.date() for _, timespan in to_schedule)
+    windows:dict[tuple[int, int] | int, list[int]] = defaultdict(list)
+    for pid, (_, timespan) in enumerate(to_schedule):
+        day = timespan.start.date()
+        windows[week_of(day) if horizon == "week" else (day - first_day).days // horizon].append(pid)
+    return [windows[window] for window in sorted(windows)]
+
+def schedule_rolling(
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        horizon="week",
+        repair=False,
+        solver_max_time=10,
+        min_one_shift_per_employee=False,
+        fixed_schedule:list[tuple[str, str, Timespan]]=None,
+        previous_schedule:list[tuple[str, str, Timespan]]=None,
+        stats:ScheduleStats=None,
+        **options
+    ) -> list[tuple[str, str, Timespan]] | None:
+    """
+    Solves a schedule one window of the horizon at a time, with every earlier window fixed.
+    With repair, the days around each window boundary are then solved again with everything else fixed,
+    undoing choices made without knowing the next window.
+    solver_max_time is one budget for every window and repair, shared evenly between those still to solve.
+    Options are passed on to schedule_problem.
+    """
+    windows = horizon_windows(to_schedule, horizon)
+    solves_left = len(windows) + (len(windows) - 1 if repair else 0)
+    deadline = perf_counter() + solver_max_time if solver_max_time > 0 else None
+    
+    def solve(rows, fixed, min_one_shift, hint):
+        nonlocal solves_left
+        # 0 means no limit to the solver, so a share of an exhausted budget is never less than a moment
+        share = 0 if deadline == None else max(0.01, (deadline - perf_counter()) / max(1, solves_left))
+        solves_left -= 1
+        
+        window_stats = ScheduleStats() if stats != None else None
+        window_schedule = schedule_problem(
+            rows, employees, stats=window_stats, solver_max_time=share,
+            min_one_shift_per_employee=min_one_shift, fixed_schedule=fixed, previous_schedule=hint, **options
+        )
+        if stats != None: stats.merge(window_stats)
+        return window_schedule
+    
+    fixed_schedule = list(fixed_schedule or [])
+    schedule = list()
+    for i, pids in enumerate(windows):
+        # Employees without a shift yet can only be made up for in the last window
+        window_schedule = solve([to_schedule[pid] for pid in pids], fixed_schedule + schedule, min_one_shift_per_employee and i == len(windows) - 1, previous_schedule)
+        if window_schedule == None:
+            return None
+        schedule.extend(window_schedule)
+    
+    if not repair:
         return schedule
+    
+    window_days = 7 if horizon == "week" else horizon
+    for pids in windows[1:]:
+        # Repairs only improve a complete schedule, so are left out once the time is up
+        if deadline != None and perf_counter() >= deadline:
+            break
+        boundary = min(to_schedule[pid][1].start.date() for pid in pids)
+        first_day = boundary - timedelta(days=max(1, window_days // 2))
+        last_day = boundary + timedelta(days=max(1, window_days // 2))
+        
+        in_repair = lambda day: first_day <= day < last_day
+        rows = [(position, timespan) for position, timespan in to_schedule if in_repair(timespan.start.date())]
+        kept = [assignment for assignment in schedule if not in_repair(assignment[2].start.date())]
+        
+        # The current assignments are a solution of the repair, so the search starts from them
+        repaired = solve(rows, fixed_schedule + kept, min_one_shift_per_employee, schedule)
+        if repaired != None:
+            schedule = kept + repaired
+    return schedule
+
+def _schedule_component(to_schedule, employees, return_stats, options) -> tuple[list | None, ScheduleStats | None]:
+    """Process pool entry point for solving one independent part of a schedule."""
+    stats = ScheduleStats() if return_stats else None
+    return schedule_problem(to_schedule, employees, stats=stats, **options), stats
+
+# Besides this one, the modules whose code decides which schedule is found (scoring and parsing)
+SCHEDULE_DEPENDENCIES = ("modules.dtypes", "modules.parse_data")
+
+# Failed schedules are not stored, so they are retried next time
+@persistent_cache(store_if=lambda result: (result[0] if isinstance(result, tuple) else result) != None, dependencies=SCHEDULE_DEPENDENCIES)
+def create_schedule(
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        solver_max_time=10,
+        solver_seed=0,
+        max_hours_per_week=18,
+        shift_lengths=[3, 4],
+        min_one_shift_per_employee=False,
+        absolute_shift_minimum_length=2.5,
+        max_shifts_per_day=1,
+        shift_granularity=1,
+        consistent_shift_weight=1.5,
+        hard_availability=True,
+        soft_availability_fallback=True,
+        deviation_encoding="linear",
+        return_stats=False,
+        decompose=True,
+        max_workers=None,
+        num_workers=0,
+        horizon=None,
+        repair=False,
+        previous_schedule:list[tuple[str, str, Timespan]]=None,
+        quick=False,
+        greedy_seed=True
+    ) -> list[tuple[str, str, Timespan]] | None | tuple[list[tuple[str, str, Timespan]] | None, ScheduleStats]:
+    """
+    May take a while to run if there are many possible shifts.
+    Returns a list of tuples containing the employee name, position scheduled, and shift timespan.
+    
+    With hard_availability, employees are never scheduled while unavailable, which keeps the model small.
+    If that is proven infeasible and soft_availability_fallback is set, the schedule is solved again
+    allowing (but heavily penalizing) shifts while unavailable. solver_max_time is shared by both attempts.
+    
+    With decompose, groups of positions that share no qualified employees are solved as separate models,
+    concurrently in up to max_workers processes (default: one per CPU; 1 solves them one after another).
+    num_workers caps the solver's search threads (default: every core), and is split between concurrent parts.
+    
+    With a horizon ("week" for ISO weeks, or a number of days), the schedule is solved one window at a time
+    with earlier windows fixed, which keeps each model small at some cost in optimality.
+    ISO weeks keep weekly hour limits and preferences exact. With repair, the days around
+    each window boundary are solved again afterwards. solver_max_time is shared by all windows and repairs.
+    
+    A previous_schedule (e.g. from before a small edit to the inputs) is used as the solver's starting point,
+    so the result is found sooner and tends to stay close to it.
+    Without one and with greedy_seed, the solver starts from a greedy_schedule instead.
+    
+    With quick, only the greedy_schedule is built, which takes milliseconds instead of a full solve
+    but is further from optimal and does not enforce min_one_shift_per_employee.
+    
+    Each attempt is first checked with check_feasibility, and skipped if the employees cannot possibly
+    cover the shifts. Its report of uncovered windows and weekly shortfalls is kept in the stats.
+    
+    With return_stats, returns a tuple of the schedule and a ScheduleStats
+    describing where build and solve time went.
+    """
+    options = dict(
+        solver_max_time=solver_max_time,
+        solver_seed=solver_seed,
+        hard_availability=hard_availability,
+        soft_availability_fallback=soft_availability_fallback,
+        max_hours_per_week=max_hours_per_week,
+        shift_lengths=shift_lengths,
+        min_one_shift_per_employee=min_one_shift_per_employee,
+        absolute_shift_minimum_length=absolute_shift_minimum_length,
+        max_shifts_per_day=max_shifts_per_day,
+        shift_granularity=shift_granularity,
+        consistent_shift_weight=consistent_shift_weight,
+        deviation_encoding=deviation_encoding,
+        num_workers=num_workers,
+        horizon=horizon,
+        repair=repair,
+        previous_schedule=previous_schedule,
+        quick=quick,
+        greedy_seed=greedy_seed
+    )
+    
+    components = find_components(to_schedule, employees) if decompose else []
+    if len(components) <= 1:
+        stats = ScheduleStats() if return_stats else None
+        schedule = schedule_problem(to_schedule, employees, stats=stats, **options)
+        return (schedule, stats) if return_stats else schedule
+    
+    if min_one_shift_per_employee:
+        component_employees = set(emp_name for _, emp_names in components for emp_name in emp_names)
+        for emp_name, emp_data in employees.items():
+            if emp_name not in component_employees:
+                print(f"Employee {emp_name} has not qualified for any shifts. Quals: {emp_data.positions} Positions: {set(p for p, _ in to_schedule)}")
+    
+    problems = [
+        ([to_schedule[pid] for pid in pids], {emp_name: employees[emp_name] for emp_name in emp_names})
+        for pids, emp_names in components
+    ]
+    
+    workers = min(len(problems), max_workers or os.cpu_count() or 1)
+    # Drafts take less time than starting processes to make them in
+    if quick or workers == 1:
+        results = [_schedule_component(*problem, return_stats, options) for problem in problems]
     else:
-        err_text = "Failed to schedule shifts. Ensure you have enough employees to cover all shifts!\n"
-        # for var_index in solver.ResponseProto():
-        #     print(var_index, model.VarIndexToVarProto(var_index))
-        return None
+        # Split the cores between the concurrent solvers instead of each using all of them
+        options['num_workers'] = max(1, (num_workers or os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_schedule_component, *problem, return_stats, options) for problem in problems]
+            results = [future.result() for future in futures]
+    
+    stats = ScheduleStats() if return_stats else None
+    schedule = list()
+    for component_schedule, component_stats in results:
+        if stats != None: stats.merge(component_stats)
+        if schedule != None and component_schedule != None:
+            schedule.extend(component_schedule)
+        else:
+            schedule = None
+    return (schedule, stats) if return_stats else schedule
+
+def changed_days(
+        previous_schedule: list[tuple[str, str, Timespan]],
+        previous_to_schedule: list[tuple[str, Timespan]],
+        previous_employees: dict[str, Employee],
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+    ) -> set[date]:
+    """
+    Finds the days of to_schedule whose assignments an edit of the inputs can change:
+    days with added or removed positions to fill, days an employee's availability changed,
+    and for employees who were removed or otherwise changed, every week they were scheduled in.
+    """
+    days = set(timespan.start.date() for _, timespan in to_schedule)
+    
+    # Positions to fill that were added or removed
+    changed = set(timespan.start.date() for _, timespan in set(previous_to_schedule) ^ set(to_schedule))
+    
+    scheduled_weeks:dict[str, set[tuple[int, int]]] = defaultdict(set)
+    for emp_name, _, shift in previous_schedule:
+        scheduled_weeks[emp_name].add(week_of(shift.start.date()))
+    
+    for emp_name in set(previous_employees) | set(employees):
+        old, new = previous_employees.get(emp_name), employees.get(emp_name)
+        if old == new:
+            continue
+        
+        # Added employees only add options, the previous schedule still works without them
+        if old == None:
+            continue
+        
+        if new != None and replace(old, availability=new.availability) == new:
+            # Only availability changed, which only matters on the days it changed
+            for day in days:
+                start = to_minutes(datetime.combine(day, time()))
+                if old.availability.clip(start, start + MINUTES_PER_DAY) != new.availability.clip(start, start + MINUTES_PER_DAY):
+                    changed.add(day)
+        else:
+            # Preferences, hours and positions are weighed over whole weeks
+            changed.update(day for day in days if week_of(day) in scheduled_weeks[emp_name])
+    return changed & days
+
+def resolve_schedule(
+        previous_schedule: list[tuple[str, str, Timespan]],
+        to_schedule: list[tuple[str, Timespan]],
+        employees: dict[str, Employee],
+        affected_days: set[date]=None,
+        previous_to_schedule: list[tuple[str, Timespan]]=None,
+        previous_employees: dict[str, Employee]=None,
+        return_stats=False,
+        **options
+    ) -> list[tuple[str, str, Timespan]] | None | tuple[list[tuple[str, str, Timespan]] | None, ScheduleStats]:
+    """
+    Re-solves a schedule after a small edit to its inputs, changing as little as possible.
+    Every assignment of previous_schedule outside of affected_days is kept as is,
+    and only the affected days are solved again, starting from their previous assignments.
+    
+    affected_days defaults to the changed_days between the previous and the new inputs.
+    Options are passed on to schedule_problem, so are those of create_schedule
+    except decompose and max_workers, which are ignored: the affected days are solved as one model.
+    """
+    options.pop('decompose', None)
+    options.pop('max_workers', None)
+
+    if affected_days == None:
+        if previous_to_schedule == None or previous_employees == None:
+            raise ValueError("Either affected_days or the previous inputs must be given.")
+        affected_days = changed_days(previous_schedule, previous_to_schedule, previous_employees, to_schedule, employees)
+    
+    kept = [assignment for assignment in previous_schedule if assignment[2].start.date() not in affected_days]
+    rows = [(position, timespan) for position, timespan in to_schedule if timespan.start.date() in affected_days]
+    
+    stats = ScheduleStats() if return_stats else None
+    schedule = kept
+    if len(rows) > 0:
+        resolved = schedule_problem(rows, employees, stats=stats, fixed_schedule=kept, previous_schedule=previous_schedule, **options)
+        schedule = None if resolved == None else kept + resolved
+    return (schedule, stats) if return_stats else schedule